@@ -0,0 +1,103 @@
+"""
+Check and benchmark `toolchain/artifacts.py` in a temporary directory.
+
+Fetches a firmware from a local HTTP server twice (the second time from
+the cache, with the server stopped, as offline), installs dependencies
+twice with a fake installer, then checks integrity checks and eviction.
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/artifacts-cache.py`
+"""
+
+import functools
+import hashlib
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'toolchain'))
+import artifacts
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def serve(directory):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+installs = []
+
+def install(requirements, output):
+    installs.append(requirements)
+    time.sleep(0.2)  # as upip, but faster
+    os.makedirs(os.path.join(output, 'umqtt'))
+    with open(os.path.join(output, 'umqtt', 'simple.py'), 'w') as f:
+        f.write('# installed\n')
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    f(*args, **kwargs)
+    return time.perf_counter() - start
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        www, output = os.path.join(root, 'www'), os.path.join(root, 'firmware.bin')
+        os.makedirs(www)
+        firmware = os.urandom(1 << 20)
+        with open(os.path.join(www, 'esp32.bin'), 'wb') as f:
+            f.write(firmware)
+        sha256 = hashlib.sha256(firmware).hexdigest()
+        server = serve(www)
+        url = 'http://127.0.0.1:%d/esp32.bin' % server.server_address[1]
+        cache = artifacts.Cache(os.path.join(root, 'cache'), 3 << 20)
+
+        download = timed(artifacts.fetch, cache, url, output, sha256)
+        try:
+            artifacts.fetch(cache, url, output, '0' * 64)  # not cached with this hash: downloads again
+            assert False
+        except OSError as e:
+            assert 'Checksum mismatch' in str(e), e
+        server.shutdown()
+        server.server_close()
+        cached = timed(artifacts.fetch, artifacts.Cache(cache.path), url, output, sha256)  # offline
+        with open(output, 'rb') as f:
+            assert f.read() == firmware
+        print('firmware: %.1fms downloaded, %.1fms cached' % (download * 1000, cached * 1000))
+
+        requirements, lib = os.path.join(root, 'requirements.txt'), os.path.join(root, 'lib')
+        with open(requirements, 'w') as f:
+            f.write('micropython-umqtt.simple\n')
+        installed = timed(artifacts.deps, cache, requirements, lib, install=install)
+        cached = timed(artifacts.deps, cache, requirements, lib, install=install)
+        assert len(installs) == 1 and os.path.exists(os.path.join(lib, 'umqtt', 'simple.py'))
+        print('deps: %.1fms installed, %.1fms cached' % (installed * 1000, cached * 1000))
+        with open(requirements, 'a') as f:
+            f.write('micropython-logging\n')
+        artifacts.deps(cache, requirements, lib, install=install)
+        assert len(installs) == 2  # requirements changed
+
+        path = cache.get('url:%s' % url)
+        with open(path, 'r+b') as f:
+            f.write(b'corrupted')
+        assert cache.get('url:%s' % url) is None and not os.path.exists(path)
+
+        for i in range(5):  # 1M each in a 3M cache: the oldest are evicted
+            filename = cache.temporary()
+            with open(filename, 'wb') as f:
+                f.write(os.urandom(1 << 20))
+            cache.put('test:%d' % i, filename)
+        assert cache.total() <= cache.size
+        assert 'test:4' in cache.index and 'test:0' not in cache.index
+        assert len(os.listdir(os.path.join(cache.path, 'objects'))) == len(cache.index)
+        print('ok')
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
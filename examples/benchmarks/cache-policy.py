@@ -0,0 +1,73 @@
+"""
+Check `cache.Cache` with a virtual clock: time to live, least recently used
+eviction, the byte budget, and concurrent `acall`/`amemoize` computing a
+value once (and sharing its exception when computing it fails).
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/cache-policy.py`
+"""
+
+import asyncio
+
+from itiot import cache
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+    def __call__(self):
+        return self.now
+    def advance(self, ms):
+        self.now += ms
+
+def ttl():
+    clock = Clock()
+    c = cache.Cache(ttl=2, clock=clock)
+    c.set('a', 1)
+    c.set('b', 2, ttl=5)
+    clock.advance(1999)
+    assert c.get('a') == 1
+    clock.advance(1)
+    assert c.get('a') is None and c.get('b') == 2  # expired, own ttl
+    assert c.stats()['bytes'] == 16  # the expired entry is no longer counted
+    print('ttl: ok')
+
+def lru():
+    c = cache.Cache(size=3, clock=Clock())
+    for key in 'abc':
+        c.set(key, key)
+    c.get('a')  # most recently used
+    c.set('d', 'd')
+    assert list(c.entries) == ['c', 'a', 'd'] and c.evictions == 1
+    print('lru: ok')
+
+def budget():
+    c = cache.Cache(size=100, budget=1000, clock=Clock())
+    for key in range(5):
+        c.set(key, b'x' * 300)
+    assert list(c.entries) == [2, 3, 4] and c.used == 900 and c.evictions == 2
+    c.set('big', b'x' * 2000)  # larger than the budget alone: not kept
+    assert not c.entries and c.used == 0
+    print('budget: ok')
+
+async def stampede(tasks=10):
+    c = cache.Cache(clock=Clock())
+    calls = []
+    @c.amemoize
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+    assert await asyncio.gather(*[slow(21) for _ in range(tasks)]) == [42] * tasks
+    assert calls == [21]
+    async def fail():
+        calls.append('fail')
+        await asyncio.sleep(0.01)
+        raise ValueError('failed')
+    results = await asyncio.gather(*[c.acall('fail', fail) for _ in range(tasks)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results) and calls.count('fail') == 1
+    assert not c.pending and 'fail' not in c.entries
+    print('acall: %d concurrent tasks, computed once, exception shared: ok' % tasks)
+
+ttl()
+lru()
+budget()
+asyncio.run(stampede())
@@ -0,0 +1,81 @@
+"""
+Check and benchmark `toolchain/fleet.py` with simulated devices:
+temporary directories behind a transport as slow as a serial link.
+
+Deploys the itiot library to several devices at once, one device
+failing its first attempt, and checks that all devices are deployed,
+that the failure was retried, and that the deployment took about the
+time of the slowest device rather than the sum of all.
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/fleet-directory.py`
+"""
+
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'toolchain'))
+import fleet
+import sync
+
+baud = 1152000  # 10 times 115200, to keep the benchmark short
+
+class Serial(sync.Directory):
+    """
+    Directory taking the time of a serial link to write to.
+    """
+
+    def __init__(self, device, baud):
+        super().__init__(device)
+        self.baud = baud
+
+    def write(self, path, chunks):
+        super().write(path, self.delay(chunks))
+
+    def delay(self, chunks):
+        for compressed, payload in chunks:
+            time.sleep(len(payload) * 10 / self.baud)  # 10 bits per byte
+            yield compressed, payload
+
+failed = set()
+
+def flaky(device, log):
+    if device.endswith('2') and device not in failed:
+        failed.add(device)
+        raise OSError('could not enter raw repl')
+
+def main(n=6):
+    root = tempfile.mkdtemp()
+    try:
+        for i in range(n):
+            os.makedirs(os.path.join(root, 'device%d' % i))
+        source = os.path.join(os.path.dirname(__file__), '..', '..', 'itiot')
+        targets = fleet.devices([os.path.join(root, 'device*')])
+        assert len(targets) == n, targets
+        assert fleet.devices(['a,b', 'b', 'c']) == ['a', 'b', 'c']
+        steps = [('connect', flaky), ('build', fleet.upload(source, '/pyboard', 'build', baud=baud, connect=Serial))]
+        results, elapsed = fleet.Fleet(targets, steps, retries=1, delay=0.1).run()
+        fleet.report(results, elapsed)
+        assert all(result.ok for result in results)
+        assert [result.retries for result in results] == [0, 0, 1, 0, 0, 0]
+        for device in targets:
+            files = list(sync.manifest(source))
+            match, mismatch, errors = filecmp.cmpfiles(source, os.path.join(device, 'pyboard'), files, shallow=False)
+            assert not mismatch and not errors, (device, mismatch, errors)
+        sequential = sum(result.time for result in results)
+        slowest = max(result.time for result in results)
+        print('%d devices in %.2fs, slowest %.2fs, %.2fs sequentially (%.1fx)'
+              % (n, elapsed, slowest, sequential, sequential / elapsed))
+        assert elapsed < slowest * 1.5, (elapsed, slowest)
+
+        results, elapsed = fleet.Fleet(targets, [('fail', lambda device, log: 1 / 0)], retries=1, delay=0).run()
+        assert not any(result.ok for result in results) and 'division' in results[0].error
+        print('ok')
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Stress `http.Asyncio` with interleaved requests to a coroutine handler.
+
+Each client posts its own body to a handler that yields to the event loop
+between reading its request and answering, so that requests overlap:
+every response must echo the body of its own request.
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-concurrency.py`
+"""
+
+import asyncio
+import random
+import time
+
+from itiot import http
+
+app = http.App('benchmark')
+
+@app.route('/echo/:id', methods=['POST'], request=True, coroutine=True)
+async def echo(id, request):
+    body = request.body
+    await asyncio.sleep(random.random() / 100)
+    return '%s:%s' % (id, body)
+
+async def client(address, id, requests):
+    reader, writer = await asyncio.open_connection(*address)
+    errors = 0
+    for i in range(requests):
+        body = ('%s-%s' % (id, i)).encode()
+        writer.write(b'POST /echo/%d HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s' % (id, len(body), body))
+        await writer.drain()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line.lower().startswith(b'content-length:'):
+                length = int(line[15:])
+            if line == b'\r\n':
+                break
+        received = await reader.readexactly(length)
+        if received != b'%d:%s' % (id, body):
+            errors += 1
+    writer.close()
+    return errors
+
+async def stress(clients=16, requests=50):
+    server = http.Asyncio(app)
+    server.limit = clients
+    listener = await asyncio.start_server(server.serve, '127.0.0.1', 0)
+    address = listener.sockets[0].getsockname()
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(client(address, id, requests) for id in range(clients)))
+    elapsed = time.perf_counter() - start
+    listener.close()
+    print('%s clients x %s requests: %d req/s, %s mismatched responses'
+          % (clients, requests, clients * requests / elapsed, sum(errors)))
+    assert not sum(errors)
+
+asyncio.run(stress())
@@ -0,0 +1,73 @@
+"""
+Benchmark and check `http.App` ETags: a request with a matching If-None-Match
+is answered with a header-only 304, a changed body with a 200 and its new
+ETag, and streamed or sliced responses are not tagged.
+
+Reports the bytes sent and the time to answer a 200 and a 304: a 304 saves
+bytes on the network, not time on the server, that still calls the handler
+and computes the checksum of its body.
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-etag.py`
+"""
+
+from itiot import http
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+app = http.App('benchmark')
+state = {'temperature': 21.3}
+
+@app.route('/dht')
+def dht():
+    return '{"temperature": %s, "history": [%s]}' % (state['temperature'], ', '.join(['20.5'] * 64))
+
+@app.route('/stream')
+def stream():
+    return http.Response((chunk for chunk in (b'a', b'b')))
+
+@app.route('/sliced', sliced=True)
+def sliced():
+    yield
+    return 'done'
+
+def get(path, etag=None):
+    request = 'GET %s HTTP/1.1\r\n%s\r\n' % (path, 'If-None-Match: %s\r\n' % etag if etag else '')
+    response = app.handle(request.encode())
+    response.persist(http.Request(request.encode()))
+    return response, b''.join(bytes(chunk) for chunk in response.chunks())
+
+def measure(path, etag, n=1000):
+    start = ticks_us()
+    for _ in range(n):
+        get(path, etag)
+    return ticks_diff(ticks_us(), start) / n
+
+def run():
+    response, sent = get('/dht')
+    etag = response.headers['ETag']
+    assert response.status == 200 and sent.endswith(response.body)
+
+    not_modified, sent_304 = get('/dht', etag)
+    assert not_modified.status == 304 and not_modified.body == b'' and sent_304.endswith(b'\r\n\r\n')
+    assert not_modified.headers['ETag'] == etag and 'Content-Length' not in not_modified.headers
+    assert get('/dht', 'W/%s' % etag)[0].status == 304 and get('/dht', '"x", %s' % etag)[0].status == 304
+
+    state['temperature'] = 22.1
+    changed, _ = get('/dht', etag)
+    assert changed.status == 200 and changed.headers['ETag'] != etag and b'22.1' in changed.body
+    state['temperature'] = 21.3
+
+    assert 'ETag' not in get('/stream')[0].headers
+    assert 'ETag' not in get('/sliced')[0].headers and get('/sliced')[0].body == b'done'
+    assert get('/sliced', '*')[0].status == 200
+
+    print('%-6s %10s %10s' % ('status', 'bytes', 'us'))
+    print('%-6s %10d %10.1f' % (200, len(sent), measure('/dht', None)))
+    print('%-6s %10d %10.1f' % (304, len(sent_304), measure('/dht', etag)))
+
+run()
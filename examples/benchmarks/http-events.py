@@ -0,0 +1,58 @@
+"""
+Benchmark `http.EventStream` on `http.Asyncio`: latency from
+`Events.publish` to the event received by subscribers.
+
+Subscribers sleep until an event is published (no polling), so the
+latency is the time of a loop turn. Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-events.py`
+"""
+
+import asyncio
+import time
+
+from itiot import http
+
+app = http.App('benchmark')
+events = http.Events()
+http.EventStream.heartbeat = 0.05  # to notice disconnected subscribers before the end
+
+@app.route('/events')
+def stream():
+    return http.EventStream(events)
+
+async def subscriber(address, n, latencies):
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(b'GET /events HTTP/1.1\r\n\r\n')
+    while (await reader.readline()).strip():
+        pass  # head
+    assert await reader.readline() == b'retry: %d\n' % (http.EventStream.retry * 1000)
+    received = 0
+    while received < n:
+        line = await reader.readline()
+        if line.startswith(b'data: '):
+            latencies.append(time.perf_counter() - float(line[6:]))
+            received += 1
+    writer.close()
+
+async def main(clients=8, n=100):
+    server = http.Asyncio(app)
+    server.limit = clients
+    listener = await asyncio.start_server(server.serve, '127.0.0.1', 0)
+    address = listener.sockets[0].getsockname()
+    latencies = []
+    tasks = [asyncio.create_task(subscriber(address, n, latencies)) for _ in range(clients)]
+    while len(events.subscribers) < clients:
+        await asyncio.sleep(0.01)
+    for i in range(n):
+        events.publish('tick', time.perf_counter())
+        await asyncio.sleep(0.005)
+    await asyncio.gather(*tasks)
+    while events.subscribers:
+        await asyncio.sleep(0.05)
+    listener.close()
+    latencies.sort()
+    print('%d subscribers x %d events: latency median %.2f ms, max %.2f ms'
+          % (clients, n, latencies[len(latencies)//2] * 1000, latencies[-1] * 1000))
+    assert latencies[len(latencies)//2] < 0.02  # polling every 0.1s took 50ms on average
+
+asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Load test `http.Asyncio` with and without persistent connections.
+
+Serves a small app on localhost with plain python (asyncio), eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-keepalive.py`
+
+or load tests a running MCU server, eg:
+`python3 examples/benchmarks/http-keepalive.py 192.168.0.254:80`
+"""
+
+import asyncio
+import socket
+import sys
+import threading
+import time
+
+def serve():
+    from itiot import http
+    app = http.App('benchmark')
+
+    @app.route('/dht')
+    def dht():
+        return '{"temperature": 21.3, "humidity": 48.2}'
+
+    server = http.Asyncio(app)
+    server.limit = 16
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(asyncio.start_server(server.serve, '127.0.0.1', 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return listener.sockets[0].getsockname()
+
+def receive(stream):
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            raise ConnectionError('Connection closed by server')
+        if line.lower().startswith(b'content-length:'):
+            length = int(line[15:])
+        if line == b'\r\n':
+            break
+    return stream.read(length)
+
+def client(address, requests, keepalive):
+    connection = b'keep-alive' if keepalive else b'close'
+    request = b'GET /dht HTTP/1.1\r\nHost: %s\r\nConnection: %s\r\n\r\n' % (address[0].encode(), connection)
+    conn = stream = None
+    for _ in range(requests):
+        if conn is None:
+            conn = socket.create_connection(address)
+            stream = conn.makefile('rb')
+        conn.sendall(request)
+        receive(stream)
+        if not keepalive:
+            stream.close()
+            conn.close()
+            conn = None
+    if conn is not None:
+        stream.close()
+        conn.close()
+
+def measure(address, keepalive, clients=4, requests=200):
+    threads = [threading.Thread(target=client, args=(address, requests, keepalive))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients * requests / (time.perf_counter() - start)
+
+def run():
+    if len(sys.argv) > 1:
+        host, port = sys.argv[1].split(':')
+        address = (host, int(port))
+    else:
+        address = serve()
+    print('%12s %12s' % ('keep-alive', 'req/s'))
+    for keepalive in (False, True):
+        print('%12s %12d' % (keepalive, measure(address, keepalive)))
+
+run()
@@ -0,0 +1,103 @@
+"""
+Benchmark `http.Poll`, the uselect.poll socket backend, with real sockets.
+
+Serves a small app on localhost with plain python (or micropython unix port), eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-poll.py`
+
+Reports request latency and throughput with concurrent clients,
+and checks that a request larger than one socket read is received whole,
+that a malformed request is answered with 400 without stopping the server,
+and that a client not reading a large response does not stall the others.
+"""
+
+import socket
+import threading
+import time
+
+from itiot import http
+
+app = http.App('benchmark')
+
+@app.route('/dht')
+def dht():
+    return '{"temperature": 21.3, "humidity": 48.2}'
+
+@app.route('/upload', methods=['POST'], request=True)
+def upload(request):
+    return len(request.data)
+
+@app.route('/big')
+def big():
+    return http.Response(b'x' * 65536 for _ in range(64))  # 4M, streamed
+
+def serve():
+    server = http.Poll(app)
+    server.limit = 16
+    server.listen('127.0.0.1', 0)
+    def loop():
+        while True:
+            server.step(1000)
+    threading.Thread(target=loop, daemon=True).start()
+    return server.socket.getsockname()
+
+def request(address, bites):
+    conn = socket.create_connection(address)
+    conn.sendall(bites)
+    response = b''
+    while True:
+        data = conn.recv(4096)
+        if not data:
+            break
+        response += data
+    conn.close()
+    return response
+
+def client(address, requests, latencies):
+    for _ in range(requests):
+        start = time.perf_counter()
+        request(address, b'GET /dht HTTP/1.1\r\nConnection: close\r\n\r\n')
+        latencies.append(time.perf_counter() - start)
+
+def slow(address):
+    conn = socket.socket()
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    conn.connect(address)
+    conn.sendall(b'GET /big HTTP/1.1\r\nConnection: close\r\n\r\n')
+    time.sleep(0.1)  # not reading: the server cannot send the whole response
+    start = time.perf_counter()
+    response = request(address, b'GET /dht HTTP/1.1\r\nConnection: close\r\n\r\n')
+    latency = time.perf_counter() - start
+    assert response.endswith(dht().encode()) and latency < 1, latency
+    received = 0
+    while True:
+        data = conn.recv(65536)
+        if not data:
+            break
+        received += len(data)
+    conn.close()
+    assert received > 64 * 65536, received
+    print('request during a stalled 4M response: %.2f ms, then the response was sent whole' % (latency * 1000))
+
+def run(clients=4, requests=200):
+    address = serve()
+    body = b'x' * 12000
+    response = request(address, b'POST /upload HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(body), body))
+    assert response.endswith(b'\r\n\r\n%d' % len(body)), response
+    for length in (b'abc', b'-1'):
+        response = request(address, b'POST /upload HTTP/1.1\r\nContent-Length: %s\r\n\r\n' % length)
+        assert response.startswith(b'HTTP/1.0 400'), response
+    slow(address)
+    latencies = []
+    threads = [threading.Thread(target=client, args=(address, requests, latencies)) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print('%s clients x %s requests: %d req/s, latency median %.2f ms, max %.2f ms'
+          % (clients, requests, len(latencies) / elapsed,
+             latencies[len(latencies)//2] * 1000, latencies[-1] * 1000))
+
+run()
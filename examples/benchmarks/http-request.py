@@ -0,0 +1,90 @@
+"""
+Benchmark `http.Request` parsing, from a buffer and from a stream reader.
+
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-request.py`
+
+The stream reader is a stand-in for the uasyncio StreamReader,
+serving the request in small chunks like a socket would.
+Also checks that a header line without colon is answered with 400.
+"""
+
+from itiot import http
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+class Reader(object):
+
+    def __init__(self, bites, chunk=64):
+        self.bites = bites
+        self.chunk = chunk
+        self.position = 0
+
+    async def readline(self):
+        end = self.bites.find(b'\n', self.position, self.position + self.chunk)
+        end = self.position + self.chunk if end < 0 else end + 1
+        line = self.bites[self.position:end]
+        self.position += len(line)
+        if line and not line.endswith(b'\n'):
+            line += await self.readline()
+        return line
+
+    async def readexactly(self, n):
+        data = self.bites[self.position:self.position + n]
+        self.position += len(data)
+        return data
+
+def request(body=b'ON'):
+    return (b'POST /switch/1?source=ha HTTP/1.1\r\n'
+            b'Host: 192.168.0.254\r\n'
+            b'User-Agent: HomeAssistant/0.101.3 aiohttp/3.6.1 Python/3.7\r\n'
+            b'Accept: */*\r\n'
+            b'Content-Length: %d\r\n'
+            b'\r\n' % len(body)) + body
+
+def check(r, body):
+    assert (r.method, r.path, r.query, r.protocol) == ('POST', '/switch/1', 'source=ha', 'HTTP/1.1'), r
+    assert r.headers['host'] == '192.168.0.254', r.headers
+    assert bytes(r.data) == body, bytes(r.data)
+
+async def areceive(bites):
+    r = http.Request()
+    assert await r.aread(Reader(bites))
+    return r
+
+def measure(f, iterations):
+    start = ticks_us()
+    for _ in range(iterations):
+        f()
+    return iterations * 1000000 / max(ticks_diff(ticks_us(), start), 1)
+
+def run(sizes=(2, 1024, 8192), iterations=500):
+    loop = asyncio.get_event_loop()
+    print('%8s %16s %16s' % ('body', 'buffer (req/s)', 'stream (req/s)'))
+    for size in sizes:
+        body = b'x' * size
+        bites = request(body)
+        check(http.Request(bites), body)
+        check(loop.run_until_complete(areceive(bites)), body)
+        buffer = measure(lambda: http.Request(bites), iterations)
+        stream = measure(lambda: loop.run_until_complete(areceive(bites)), iterations)
+        print('%8s %16d %16d' % (size, buffer, stream))
+    invalid = b'GET / HTTP/1.1\r\nHost 192.168.0.254\r\n\r\n'  # header line without colon
+    for receive in (http.Request, lambda bites: loop.run_until_complete(areceive(bites))):
+        try:
+            receive(invalid)
+            assert False, 'invalid header line accepted'
+        except http.HTTPException as e:
+            assert e.status == 400, e.status
+
+run()
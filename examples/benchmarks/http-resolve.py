@@ -0,0 +1,58 @@
+"""
+Benchmark `http.App.resolve` throughput against the number of routes.
+
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/http-resolve.py`
+
+The regex column replays the former resolve algorithm
+(sort routes, build and match a regex per route) for comparison.
+"""
+
+from itiot import http
+
+try:
+    import ure as re
+except ImportError:
+    import re
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+def make_app(n):
+    app = http.App('benchmark')
+    callback = lambda **arguments: arguments
+    for i in range(n):
+        app.route('/sensor%s/:id' % i if i % 2 else '/sensor%s/value' % i)(callback)
+    return app
+
+def regex_resolve(app, request):
+    endpoints = sorted(app.endpoints.items(), key=lambda l: len(l[0][0]), reverse=True)
+    for (route, methods), callback in endpoints:
+        if request.method in methods:
+            pattern = '/'.join(c.replace(':%s'%c[1:], '[^/].*') for c in route.split('/'))
+            if re.match('^%s$' % pattern, request.path):
+                return route, methods, callback
+
+def measure(resolve, requests, iterations):
+    start = ticks_us()
+    for _ in range(iterations):
+        for request in requests:
+            resolve(request)
+    elapsed = ticks_diff(ticks_us(), start)
+    return iterations * len(requests) * 1000000 / max(elapsed, 1)
+
+def run(counts=(5, 10, 20, 40), iterations=200):
+    print('%8s %14s %14s' % ('routes', 'tree (req/s)', 'regex (req/s)'))
+    for n in counts:
+        app = make_app(n)
+        requests = [http.Request(('GET /sensor%s/%s HTTP/1.1\r\n\r\n' % (i, '3' if i % 2 else 'value')).encode())
+                    for i in (0, n//2, n-1)]
+        tree = measure(app.resolve, requests, iterations)
+        regex = measure(lambda r: regex_resolve(app, r), requests, iterations // 10 or 1)
+        print('%8s %14d %14d' % (n, tree, regex))
+
+run()
@@ -0,0 +1,79 @@
+"""
+Run `network.Supervisor` on a fake Wifi interface that fails to connect,
+then connects, drops the link and reconnects, while a sensor task runs.
+
+Checks the backoff, the callbacks (a failing one does not stop the
+supervisor) and the RSSI tracking, and that the sensor task was never
+blocked. Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/network-supervisor.py`
+"""
+
+import asyncio
+import time
+
+from itiot import network
+
+class NIC(object):
+    """
+    Fake network.WLAN: connection attempts fail `failures` times,
+    the link drops after `lifetime` seconds.
+    """
+    def __init__(self, failures=3, lifetime=0.3):
+        self.failures = failures
+        self.lifetime = lifetime
+        self.up = None
+        self.attempts = 0
+        self.config = ['0.0.0.0', '255.255.255.0', '192.168.0.1', '192.168.0.1']
+    def active(self, active=None):
+        return True
+    def connect(self, ssid, psk):
+        self.attempts += 1
+        if self.attempts > self.failures:
+            self.up = time.time()
+    def disconnect(self):
+        self.up = None
+    def isconnected(self):
+        if self.up is not None and time.time() - self.up > self.lifetime:
+            self.up = None  # link lost
+            self.failures = self.attempts  # reconnects at first attempt
+        return self.up is not None
+    def ifconfig(self, config=None):
+        if config is None:
+            return tuple(self.config)
+        self.config = list(config)
+    def status(self, param):
+        return -60 - self.attempts
+
+async def sensor(ticks):
+    while True:
+        ticks.append(time.time())
+        await asyncio.sleep(0.005)
+
+def failing(supervisor):
+    raise ValueError('callback bug')
+
+async def run():
+    wifi = network.Wifi(NIC())
+    wifi.poll = 0.005
+    log = []
+    supervisor = network.Supervisor(wifi, 'ssid', 'psk', ip='192.168.0.254',
+                                    on_connect=lambda s: log.append(('connect', time.time())),
+                                    on_disconnect=lambda s: log.append(('disconnect', time.time())) or failing(s))
+    supervisor.check, supervisor.timeout, supervisor.backoff = 0.01, 0.02, 0.01
+    ticks = []
+    tasks = [asyncio.ensure_future(supervisor.run()), asyncio.ensure_future(sensor(ticks))]
+    await asyncio.sleep(0.6)
+    for task in tasks:
+        task.cancel()
+    gaps = max(b - a for a, b in zip(ticks, ticks[1:]))
+    print('failures %d, connects %d, disconnects %d, rssi %.1f dBm, ip %s'
+          % (supervisor.failures, supervisor.connects, supervisor.disconnects,
+             supervisor.rssi, wifi.nic.ifconfig()[0]))
+    print('callbacks: %s' % ', '.join(event for event, t in log))
+    print('sensor task: %d readings, longest gap %.1f ms' % (len(ticks), gaps * 1000))
+    assert supervisor.failures == 3 and supervisor.connects >= 2 and supervisor.disconnects >= 1
+    assert supervisor.errors == supervisor.disconnects  # the failing on_disconnect
+    assert wifi.nic.ifconfig()[0] == '192.168.0.254'
+    assert gaps < 0.05
+
+asyncio.run(run())
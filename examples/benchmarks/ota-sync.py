@@ -0,0 +1,101 @@
+"""
+Check and benchmark `ota.Receiver` with `toolchain/sync.py --ota`, against
+a local http.Poll server receiving into a temporary directory.
+
+Syncs the itiot library over HTTP, then a changed file, and checks that
+corrupted chunks, lost chunks, bad checksums and bad tokens are rejected,
+that an interrupted upload leaves the previous file intact, and that a
+receiver requires a token unless insecure.
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/ota-sync.py`
+"""
+
+import filecmp
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'toolchain'))
+import sync
+
+from itiot import http, ota
+
+def serve(root, token):
+    app = http.App('ota')
+    receiver = ota.Receiver(root, token)
+    receiver.register(app)
+    server = http.Poll(app)
+    server.listen('127.0.0.1', 0)
+    def loop():
+        while True:
+            server.step(1000)
+    threading.Thread(target=loop, daemon=True).start()
+    return receiver, server.socket.getsockname()
+
+def status(transport, *args, **kwargs):
+    try:
+        transport.request(*args, **kwargs)
+    except OSError as e:
+        return int(str(e).split(' failed: ')[1].split()[0])
+    return 200
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        source, device = os.path.join(os.path.dirname(__file__), '..', '..', 'itiot'), os.path.join(root, 'device')
+        os.makedirs(device)
+        receiver, (host, port) = serve(device, 'secret')
+        transport = sync.Ota(host, port, 'secret')
+        files = list(sync.manifest(source))
+
+        start = time.perf_counter()
+        upload, stale = sync.sync(source, '/pyboard/lib', transport, 'lib')
+        elapsed = time.perf_counter() - start
+        match, mismatch, errors = filecmp.cmpfiles(source, os.path.join(device, 'lib'), files, shallow=False)
+        assert len(match) == len(files) and receiver.received == len(files) + 2  # and the manifest, twice
+        print('%d files, %d bytes sent in %.0fms (%.1fs at 115200 baud)'
+              % (len(upload), transport.sent, elapsed * 1000, transport.sent * 10 / 115200))
+
+        upload, stale = sync.sync(source, '/pyboard/lib', transport, 'lib')
+        assert not upload and not stale
+
+        path, data = '/lib/pipe.py', b'# new version\n' * 1000
+        compressed = next(sync.chunks(data, len(data)))[1]
+        assert status(transport, 'PUT', 'file', path, compressed, offset=0, crc='00000000', z=1) == 400  # corrupted
+        assert status(transport, 'PUT', 'file', path, compressed, offset=0, crc='%08x' % zlib.crc32(compressed), z=1) == 200
+        assert status(transport, 'PUT', 'file', path, b'more', offset=99) == 409  # lost chunk
+        assert status(transport, 'POST', 'commit', path, size=len(data), sha256='0' * 64) == 422  # corrupted file
+        assert not os.path.exists(os.path.join(device, 'lib', 'pipe.py.part'))
+        with open(os.path.join(source, 'pipe.py'), 'rb') as f:
+            with open(os.path.join(device, 'lib', 'pipe.py'), 'rb') as g:
+                assert f.read() == g.read()  # interrupted upload: previous file intact
+        for token in ('wrong', 'secre', 'secret!', 'secreT'):
+            assert status(sync.Ota(host, port, token), 'GET', 'file', path) == 403, token
+        assert ota.equal('secret', 'secret') and not ota.equal('secret', '')
+        assert status(transport, 'GET', 'file', '/lib/../../etc/passwd') == 400
+
+        transport.write(path, sync.chunks(data, 1024))
+        with open(os.path.join(device, 'lib', 'pipe.py'), 'rb') as f:
+            assert f.read() == data
+        assert hashlib.sha256(transport.read(path)).digest() == hashlib.sha256(data).digest()
+        transport.write('/empty.py', [])
+        assert os.path.getsize(os.path.join(device, 'empty.py')) == 0
+        assert ota.params('path=%2Fa%20b+c.py&z=1') == {'path': '/a b c.py', 'z': '1'}
+        try:
+            ota.Receiver(device)
+            assert False, 'a receiver without token must be insecure=True'
+        except ValueError:
+            pass
+        ota.Receiver(device, insecure=True)
+        transport.close()
+        print('ok')
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
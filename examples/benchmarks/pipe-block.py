@@ -0,0 +1,74 @@
+"""
+Benchmark sampling a fake ADC one sample at a time against blocks of samples.
+
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/pipe-block.py`
+
+The scalar rows (-) pass each sample through the pipe: the mean of every
+`size` samples is computed by an element skipping the others. Under CPython
+3.11, blocks of 8 samples or more reduce samples (mean) about twice as fast,
+while mapping them (normalize+boolean) is not faster than the scalar pipe;
+blocks of 1 sample are slower.
+"""
+
+from itiot import pipe, block
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+class ADC(object):
+    def __init__(self):
+        self.value = 0
+    def read(self):
+        self.value = (self.value + 37) & 4095
+        return self.value
+
+class Mean(pipe.Element):
+    """
+    Mean of every `size` samples, skipping the others: the scalar block.Mean.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.count = self.total = 0
+    def process(self, value):
+        self.total += value
+        self.count += 1
+        if self.count < self.size:
+            return pipe.skip
+        mean = self.total / self.size
+        self.count = self.total = 0
+        return mean
+
+def measure(p, samples_per_read, samples, rounds=10):
+    """
+    Return the samples/s of `p` in the fastest of `rounds`, against noise.
+    """
+    best = None
+    for _ in range(rounds):
+        start = ticks_us()
+        for _ in range(samples // samples_per_read // rounds):
+            p.read()
+        elapsed = max(ticks_diff(ticks_us(), start), 1)
+        best = elapsed if best is None else min(best, elapsed)
+    return samples // samples_per_read // rounds * samples_per_read * 1000000 / best
+
+def run(sizes=(1, 8, 32, 128), samples=65536):
+    print('%6s %6s %22s %22s' % ('size', 'block', 'normalize+boolean/s', 'mean/s'))
+    for size in sizes:
+        boolean = pipe.Pipe(pipe.Poll(ADC()), pipe.Normalize(4095), pipe.Boolean(0.5))
+        mean = pipe.Pipe(pipe.Poll(ADC()), Mean(size), pipe.Normalize(4095))
+        print('%6s %6s %22d %22d' % (size, '-', measure(boolean, 1, samples), measure(mean, 1, samples)))
+        boolean = pipe.Pipe(block.Block(ADC(), size), block.Normalize(4095), block.Boolean(0.5))
+        mean = pipe.Pipe(block.Block(ADC(), size), block.Mean(), pipe.Normalize(4095))
+        print('%6s %6s %22d %22d' % (size, size, measure(boolean, size, samples), measure(mean, size, samples)))
+    adc = ADC()
+    expected = [adc.read() / 4095 >= 0.5 for _ in range(8)]
+    assert list(pipe.Pipe(block.Block(ADC(), 8), block.Normalize(4095), block.Boolean(0.5)).read()) == expected
+    scalar = pipe.Pipe(pipe.Poll(ADC()), Mean(8))
+    assert next(scalar) == pipe.Pipe(block.Block(ADC(), 8), block.Mean()).read()
+
+run()
@@ -0,0 +1,55 @@
+"""
+Measure the downstream work saved by `pipe.Changed` on a noisy sensor.
+
+A slowly varying reading with noise is normalized, then written to a fake
+PWM and serialized to JSON (as for publishing), with and without `Changed`.
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/pipe-changed.py`
+"""
+
+import json
+import random
+
+from itiot import pipe
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+class ADC(object):
+    def __init__(self):
+        self.i = 0
+    def read(self):
+        self.i += 1
+        return 2000 + (self.i // 500) % 4 * 300 + random.randint(-20, 20)
+
+class PWM(object):
+    def __init__(self):
+        self.writes = 0
+    def duty(self, value):
+        self.writes += 1
+
+def measure(changed, samples=20000):
+    random.seed(1)
+    pwm = PWM()
+    elements = [pipe.Poll(ADC()), pipe.Normalize(4095)]
+    if changed is not None:
+        elements.append(changed)
+    elements += [pipe.Update(pwm, write=lambda pwm, value: pwm.duty(int(value*1023))),
+                 pipe.Apply(lambda value: json.dumps({'value': value}))]
+    p = pipe.Pipe(*elements)
+    start = ticks_us()
+    for _ in range(samples):
+        p.read()
+    return samples * 1000000 / max(ticks_diff(ticks_us(), start), 1), pwm.writes
+
+print('%30s %12s %10s %11s' % ('pipe', 'samples/s', 'writes', 'suppressed'))
+for name, changed in (('without Changed', None),
+                      ('Changed(delta=0.02)', pipe.Changed(delta=0.02)),
+                      ('Changed(0.01, hysteresis=0.01)', pipe.Changed(delta=0.01, hysteresis=0.01)),
+                      ('Changed(0.02, heartbeat=0.001)', pipe.Changed(delta=0.02, heartbeat=0.001))):
+    rate, writes = measure(changed)
+    print('%30s %12d %10d %11s' % (name, rate, writes, changed.suppressed if changed else '-'))
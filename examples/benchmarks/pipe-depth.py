@@ -0,0 +1,73 @@
+"""
+Benchmark `pipe.Pipe` throughput against pipe depth.
+
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/pipe-depth.py`
+
+The generators column chains one generator per element, as in
+examples/prototyping/machine-iterators.py, for comparison: the pipe resumes
+one generator per value when iterated (`for value in pipe`) and calls each
+element. Under CPython 3.11, resuming a generator costs less than a call and
+the generator chain is about twice as fast at every depth.
+"""
+
+from itiot import pipe
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+class ADC(object):
+    def __init__(self):
+        self.value = 0
+    def read(self):
+        self.value = (self.value + 37) % 1024
+        return self.value
+
+def poll(obj):
+    while True:
+        yield obj.read()
+
+def normalize(g, max):
+    for value in g:
+        yield value / max
+
+def clamp(g, min=0, max=1):
+    for value in g:
+        yield min if value < min else max if value > max else value
+
+def generators(depth):
+    g = poll(ADC())
+    for i in range(depth):
+        g = normalize(g, 1) if i % 2 else clamp(g, 0, 1023)
+    return g
+
+def fused(depth):
+    return pipe.Pipe(pipe.Poll(ADC()), *[pipe.Normalize(1) if i % 2 else pipe.Clamp(0, 1023)
+                                         for i in range(depth)])
+
+def measure(g, samples, rounds=20):
+    """
+    Return the samples/s of `g` in the fastest of `rounds`, against noise.
+    """
+    best = None
+    for _ in range(rounds):
+        start = ticks_us()
+        for _ in range(samples // rounds):
+            next(g)
+        elapsed = max(ticks_diff(ticks_us(), start), 1)
+        best = elapsed if best is None else min(best, elapsed)
+    return samples // rounds * 1000000 / best
+
+def run(depths=(1, 2, 4, 6, 10), samples=100000):
+    print('%6s %20s %20s %20s' % ('depth', 'generators (1/s)', 'pipe next (1/s)', 'pipe for (1/s)'))
+    for depth in depths:
+        p = fused(depth)
+        print('%6s %20d %20d %20d' % (depth, measure(generators(depth), samples),
+                                      measure(p, samples), measure(iter(p), samples)))
+    assert list(zip(range(8), fused(4))) == list(zip(range(8), generators(4)))
+
+run()
@@ -0,0 +1,43 @@
+"""
+Simulate a sensor split to a fast and a slow pipe with `topology.Tee`,
+for each overflow policy, on a virtual clock.
+
+Reports the values received by each pipe, the values dropped, and checks
+that buffers stay bounded. Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/pipe-topology.py`
+"""
+
+from itiot import pipe, scheduler, topology
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+    def __call__(self):
+        return self.now
+
+class Sensor(object):
+    def __init__(self):
+        self.reads = 0
+    def read(self):
+        self.reads += 1
+        return self.reads
+
+def simulate(overflow, duration=10000, size=8):
+    clock = Clock()
+    s = scheduler.Scheduler(clock=clock)
+    sensor = Sensor()
+    tee = topology.Tee(sensor, n=2, size=size, overflow=overflow)
+    received = [[], []]
+    s.add(tee, period=0.01, priority=2)
+    s.add(pipe.Pipe(tee.branches[0], received[0].append), period=0.01, priority=1)
+    s.add(pipe.Pipe(tee.branches[1], received[1].append), period=0.25)
+    while clock() < duration:
+        clock.now += s.step()
+        for branch in tee.branches:
+            assert len(branch.buffer) <= size
+    print('%12s %8d %8d %8d %8d %8d' % (overflow, sensor.reads, len(received[0]), len(received[1]),
+                                        tee.branches[1].buffer.dropped, received[1][-1]))
+
+print('%12s %8s %8s %8s %8s %8s' % ('overflow', 'reads', 'fast', 'slow', 'dropped', 'slow last'))
+for overflow in topology.overflows:
+    simulate(overflow)
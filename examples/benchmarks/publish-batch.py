@@ -0,0 +1,123 @@
+"""
+Publish telemetry to a local stand-in server with `publish.Publish`,
+against one HTTP request per value (as `urequests.put` does).
+
+Serves with `http.Poll` on localhost with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/publish-batch.py`
+
+Reports connections and time for each, checks that the server
+decodes every value, timed in Unix time, that the pipe never posts (only
+`flush` does), that frames are kept and retried while the server is
+unreachable, and dropped when the server rejects them (4xx).
+"""
+
+import json
+import threading
+import time
+
+from itiot import http, publish
+
+app = http.App('telemetry')
+received = []
+times = []
+
+@app.route('/telemetry', methods=['POST'], request=True)
+def telemetry(request):
+    if request.headers.get('content-type') == publish.Publish.content_type:
+        decoded = publish.decode(bytes(request.data))
+        received.extend(value for t, value in decoded)
+        times.extend(t for t, value in decoded)
+    else:
+        received.append(request.json['value'])
+    return ''
+
+@app.route('/rejected', methods=['POST'])
+def rejected():
+    return http.Response('unknown sensor', 404)
+
+class Server(http.Poll):
+    connections_accepted = 0
+    def accept(self):
+        self.connections_accepted += 1
+        super().accept()
+
+def serve():
+    server = Server(app)
+    server.listen('127.0.0.1', 0)
+    def loop():
+        while True:
+            server.step(1000)
+    threading.Thread(target=loop, daemon=True).start()
+    return server
+
+class Clock(object):
+    now = 0
+    def __call__(self):
+        Clock.now += 10  # a value every 10 ms
+        return Clock.now
+
+def values(n):
+    return [round(0.5 + (i % 50) / 1000, 3) for i in range(n)]
+
+def each(address, n):
+    for value in values(n):
+        client = http.Client(*address)
+        client.request('POST', '/telemetry', json.dumps({'value': value}).encode(),
+                       {'Content-Type': 'application/json', 'Connection': 'close'})
+        client.close()
+
+def batched(address, n):
+    p = publish.Publish(address[0], '/telemetry', port=address[1], scale=1000, size=64, clock=Clock())
+    for i, value in enumerate(values(n)):
+        p.process(value)
+        if i % 100 == 99:
+            p.flush()  # as a task scheduled every second would, with a value every 10 ms
+    p.flush(force=True)
+    assert not p.frames and not p.dropped
+    assert abs(max(times) - time.time() * 1000) < 60000, max(times)  # Unix time in ms
+
+def measure(f, server, n):
+    del received[:]
+    server.connections_accepted = 0
+    start = time.perf_counter()
+    f(server.socket.getsockname(), n)
+    while len(received) < n and time.perf_counter() - start < 5:
+        time.sleep(0.001)  # let the server handle the last request
+    elapsed = time.perf_counter() - start
+    assert sorted(received) == sorted(values(n)), (len(received), n)
+    return server.connections_accepted, elapsed
+
+class Closed(http.Client):
+    requests = 0
+    def request(self, *args):
+        self.requests += 1
+        return super().request(*args)
+
+def backlog():
+    closed = Closed('127.0.0.1', 1)  # nothing listens there
+    p = publish.Publish('127.0.0.1', '/telemetry', scale=1000, size=10, backlog=3, clock=Clock(), client=closed)
+    for value in values(100):
+        p.process(value)
+    assert closed.requests == 0  # the pipe only queues frames
+    assert not p.flush() and closed.requests == 1  # stops at the first failure, to retry later
+    return len(p.frames), p.dropped
+
+def rejected(address):
+    p = publish.Publish(address[0], '/rejected', port=address[1], scale=1000, size=10, clock=Clock())
+    for value in values(30):
+        p.process(value)
+    assert p.flush() and not p.frames and p.rejected == 3 and not p.sent
+
+def run(n=1000):
+    server = serve()
+    print('%10s %8s %12s %10s' % ('publish', 'values', 'connections', 'seconds'))
+    for name, f in (('each', each), ('batched', batched)):
+        connections, elapsed = measure(f, server, n)
+        print('%10s %8d %12d %10.3f' % (name, n, connections, elapsed))
+    frames, dropped = backlog()
+    print('unreachable server: %s frames kept (backlog of 3), %s dropped' % (frames, dropped))
+    assert frames == 3 and dropped == 7
+    rejected(server.socket.getsockname())
+    print('rejecting server (404): frames dropped, not retried')
+
+run()
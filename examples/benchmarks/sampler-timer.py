@@ -0,0 +1,72 @@
+"""
+Simulate `sampler.Sampler` with a simulated timer and a loaded main context.
+
+A 1 kHz timer samples a fake ADC returning the (virtual) time, while the
+pipe takes time to process samples and the main context is periodically
+busy. Compares the sampling intervals with sampling from the main loop.
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/sampler-timer.py`
+"""
+
+from itiot import pipe, sampler
+
+class Clock(object):
+    now = 0  # microseconds
+
+class ADC(object):
+    def read(self):
+        return Clock.now // 1000 & 0xffff  # sample the time, in ms
+
+class Timer(object):
+    def init(self, freq, callback):
+        self.period = 1000000 // freq
+        self.callback = callback
+    def deinit(self):
+        pass
+
+scheduled = []
+
+def schedule(f, arg):
+    scheduled.append((f, arg))
+
+def load(t):
+    return 20000 if t % 100000 < 1000 else 0  # busy for 20 ms every 100 ms
+
+def intervals(times):
+    deltas = [b - a for a, b in zip(times, times[1:])]
+    return len(times), min(deltas), max(deltas)
+
+def simulate_sampler(duration=1000000, cost=300, size=64):
+    times = []
+    def process(value):
+        Clock.now += cost  # processing time, in the main context
+        times.append(value)
+    timer = Timer()
+    s = sampler.Sampler(ADC(), freq=1000, size=size, pipe=pipe.Pipe(process), timer=timer, schedule=schedule)
+    s.start()
+    tick = 0
+    Clock.now = 0
+    while Clock.now < duration:
+        while tick <= Clock.now:  # timer interrupts, preempting the main context
+            saved, Clock.now = Clock.now, tick
+            timer.callback(timer)
+            Clock.now = saved
+            tick += timer.period
+        if scheduled:
+            f, arg = scheduled.pop(0)
+            f(arg)
+        Clock.now += load(Clock.now) or 100
+    return intervals(times) + (s.overruns,)
+
+def simulate_loop(duration=1000000, cost=300):
+    times = []
+    adc = ADC()
+    Clock.now = 0
+    while Clock.now < duration:
+        times.append(adc.read())
+        Clock.now += cost + load(Clock.now) + 100
+    return intervals(times) + (0,)
+
+print('%10s %8s %12s %12s %9s' % ('sampling', 'samples', 'min ms', 'max ms', 'overruns'))
+print('%10s %8d %12d %12d %9d' % (('loop',) + simulate_loop()))
+print('%10s %8d %12d %12d %9d' % (('timer',) + simulate_sampler()))
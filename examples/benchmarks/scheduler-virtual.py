@@ -0,0 +1,62 @@
+"""
+Simulate `scheduler.Scheduler` with a virtual clock.
+
+Pipes take virtual time to run, so that a slow pipe delays the others:
+reports per-pipe jitter and overruns, and the time left for sleeping.
+A failing pipe is counted in its errors and does not stop the others.
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/scheduler-virtual.py`
+"""
+
+from itiot import pipe, scheduler
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+    def __call__(self):
+        return self.now
+    def advance(self, ms):
+        self.now += ms
+
+clock = Clock()
+
+class Sensor(object):
+    def __init__(self, cost):
+        self.cost = cost  # ms per read
+        self.value = 0
+    def read(self):
+        clock.advance(self.cost)
+        self.value += 1
+        return self.value
+
+class Failing(Sensor):
+    def read(self):
+        Sensor.read(self)
+        if self.value % 2:
+            raise OSError('sensor not responding')
+        return self.value
+
+def run(duration=10000):
+    s = scheduler.Scheduler(clock=clock)
+    pipes = (
+        ('touch (20ms, priority 2)', pipe.Pipe(pipe.Poll(Sensor(1)), pipe.Normalize(1023)), 0.02, None, 2),
+        ('adc (100ms)', pipe.Pipe(pipe.Poll(Sensor(2)), pipe.Normalize(1023)), 0.1, None, 1),
+        ('dht (500ms, slow)', pipe.Pipe(pipe.Poll(Sensor(30))), 0.5, 0.05, 0),
+        ('i2c (1s, fails 1 of 2)', pipe.Pipe(pipe.Poll(Failing(1))), 1, None, 0),
+    )
+    tasks = [s.add(p, period, deadline, priority) for _, p, period, deadline, priority in pipes]
+    slept = 0
+    while clock() < duration:
+        wait = s.step()
+        clock.advance(wait)
+        slept += wait
+    print('%-26s %6s %9s %9s %7s %10s %8s' % ('pipe', 'runs', 'overruns', 'skipped', 'errors', 'jitter ms', 'max ms'))
+    for (name, _, _, _, _), task in zip(pipes, tasks):
+        stats = task.stats()
+        print('%-26s %6d %9d %9d %7d %10.2f %8d' % (name, stats['runs'], stats['overruns'], stats['skipped'],
+                                                    stats['errors'], stats['jitter'], stats['jitter_max']))
+    print('idle: %d%%' % (slept * 100 // clock()))
+    assert tasks[0].jitter_max <= 30  # delayed at most by the slow pipe
+    assert tasks[3].errors == tasks[3].runs // 2 and tasks[3].runs == duration // 1000
+
+run()
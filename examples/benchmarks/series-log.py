@@ -0,0 +1,79 @@
+"""
+Check and benchmark `series.Series` in a temporary directory.
+
+Appends records past the size limit (ring), counting the flash writes
+(one per page of records), reopens the log as after a reboot, checks that
+buffered records are read before written, then drains it over HTTP with
+Range requests from `http.Poll`,
+as a client would after a network outage (malformed ranges are ignored). Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/series-log.py`
+"""
+
+import struct
+import tempfile
+import threading
+import time
+
+from itiot import http, series
+
+class Series(series.Series):
+    writes = 0
+    def flush(self):
+        if self.pending:
+            Series.writes += 1
+        super().flush()
+
+def check_ring(path, n=3000):
+    log = Series(path, format='<If', records=256, segments=4, page=512)
+    start = time.perf_counter()
+    for i in range(n):
+        log.append(i, i / 10)
+    elapsed = time.perf_counter() - start
+    assert 0 < log.pending and log.pending * log.size <= 512  # the last page, not written yet
+    assert [record[:2] for record in log.read(n - 1)] == [(n - 1, n - 1)]  # buffered
+    log.close()
+    print('%d appends/s, %d flash writes for %d records' % (n / elapsed, Series.writes, n))
+    log = Series(path, format='<If', records=256, segments=4)  # reboot
+    assert log.count == n, log.count
+    records = list(log.read())
+    assert len(records) == len(log) and records[-1][:2] == (n - 1, n - 1)
+    assert all(sequence == t for sequence, t, value in records)
+    assert log.first == n - 4 * 256 and records[0][0] == log.first  # only overwritten records are dropped
+    print('%d records kept of %d appended (from %d)' % (len(log), n, log.first))
+    return log
+
+def serve(log):
+    app = http.App('history')
+    @app.route('/history', request=True)
+    def history(request):
+        return log.respond(request)
+    server = http.Poll(app)
+    server.listen('127.0.0.1', 0)
+    def loop():
+        while True:
+            server.step(1000)
+    threading.Thread(target=loop, daemon=True).start()
+    return server.socket.getsockname()
+
+def drain(log, address):
+    client = http.Client(*address)
+    status, headers, body = client.request('GET', '/history')
+    assert status == 200 and len(body) == len(log) * log.size
+    received = log.count * log.size
+    for i in range(100):
+        log.append(log.count, 0.5)
+    status, headers, body = client.request('GET', '/history', headers={'Range': 'bytes=%d-' % received})
+    assert status == 206, status
+    assert headers['content-range'] == 'bytes %d-%d/%d' % (received, log.count * log.size - 1, log.count * log.size)
+    records = [struct.unpack(log.format, body[i:i+log.size]) for i in range(0, len(body), log.size)]
+    assert [r[0] - 1 for r in records] == list(range(log.count - 100, log.count))
+    status, headers, body = client.request('GET', '/history', headers={'Range': 'bytes=%d-' % (log.count * log.size)})
+    assert status == 416, status
+    for malformed in ('bytes=a-', 'bytes=-x', 'bytes=5', 'bytes=1-2-3'):
+        status, headers, body = client.request('GET', '/history', headers={'Range': malformed})
+        assert status == 200 and len(body) == len(log) * log.size, (malformed, status)  # ignored
+    print('drained %d new records with a Range request, on %d connection' % (len(records), client.connects))
+
+with tempfile.TemporaryDirectory() as directory:
+    log = check_ring(directory + '/smoke')
+    drain(log, serve(log))
@@ -0,0 +1,103 @@
+"""
+Check and benchmark `toolchain/sync.py` against a temporary directory
+standing in for the MCU filesystem.
+
+Syncs the itiot library, then syncs again after changing, adding and
+deleting files, and after an interrupted sync, checking that only the
+changed files are sent and that the device ends up equal to the source,
+and that uploading a .mpy deletes the .py that would shadow it.
+Runs with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/sync-directory.py`
+"""
+
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'toolchain'))
+import sync
+
+def same(source, device):
+    files = sorted(sync.manifest(source))
+    match, mismatch, errors = filecmp.cmpfiles(source, device, files, shallow=False)
+    assert not mismatch and not errors, (mismatch, errors)
+    extra = set(sync.manifest(device)) - set(files)
+    assert all(os.path.basename(p).startswith('.sync-') for p in extra), extra
+
+def run(source, device, **options):
+    transport = sync.Directory()
+    upload, stale = sync.sync(source, device, transport, 'test', **options)
+    same(source, device)
+    return upload, stale, transport.sent
+
+class Interrupted(sync.Directory):
+    writes = 3
+
+    def write(self, path, chunks):
+        self.writes -= 1
+        if not self.writes:
+            raise KeyboardInterrupt('unplugged')
+        super().write(path, chunks)
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        source, device = os.path.join(root, 'source'), os.path.join(root, 'device')
+        shutil.copytree(os.path.join(os.path.dirname(__file__), '..', '..', 'itiot'), source,
+                        ignore=shutil.ignore_patterns('__pycache__'))
+        total = sum(os.path.getsize(os.path.join(source, p)) for p in sync.manifest(source))
+
+        upload, stale, sent = run(source, device)
+        assert len(upload) == len(sync.manifest(source)) and not stale
+        print('first sync: %d files, %d bytes sent for %d bytes (compressed %.0f%%)'
+              % (len(upload), sent, total, 100. * sent / total))
+
+        upload, stale, sent = run(source, device)
+        assert not upload and not stale
+        print('unchanged: %d bytes sent' % sent)
+
+        with open(os.path.join(source, 'pipe.py'), 'a') as f:
+            f.write('\n# changed\n')
+        os.makedirs(os.path.join(source, 'extra'))
+        with open(os.path.join(source, 'extra', 'new.py'), 'w') as f:
+            f.write('x = 1\n')
+        os.remove(os.path.join(source, 'window.py'))
+        upload, stale, sent = run(source, device)
+        assert upload == ['extra/new.py', 'pipe.py'] and stale == ['window.py'], (upload, stale)
+        assert not os.path.exists(os.path.join(device, 'window.py'))
+        print('2 files changed, 1 deleted: %d bytes sent' % sent)
+
+        for name in ('http.py', 'block.py', 'series.py'):
+            with open(os.path.join(source, name), 'a') as f:
+                f.write('\n# changed\n')
+        try:
+            sync.sync(source, device, Interrupted(), 'test')
+        except KeyboardInterrupt:
+            pass
+        upload, stale, sent = run(source, device)
+        assert upload == ['block.py', 'http.py', 'series.py'], upload
+        print('after an interrupted sync: %d files sent again' % len(upload))
+
+        upload, stale, sent = run(source, device, delete=False)
+        assert not upload and not stale
+
+        built = os.path.join(root, 'built')  # a build replacing a raw build: .mpy shadowed by .py
+        os.makedirs(built)
+        with open(os.path.join(built, 'pipe.mpy'), 'wb') as f:
+            f.write(b'M\x06')
+        upload, stale = sync.sync(built, device, sync.Directory(), 'build')
+        assert upload == ['pipe.mpy'] and not os.path.exists(os.path.join(device, 'pipe.py'))
+        print('.py deleted when its .mpy is uploaded')
+
+        for i in range(0, 5000, 1000):  # chunks decompress back to the data
+            data = os.urandom(i) + b'abc' * i
+            assert b''.join(payload if not compressed else sync.zlib.decompress(payload, sync.wbits)
+                            for compressed, payload in sync.chunks(data, 512)) == data
+        print('ok')
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark `window` statistics against the list-based moving average.
+
+Runs on MCU or with plain python, eg:
+`PYTHONPATH=. python3 examples/benchmarks/window-stats.py`
+
+The list column replays `average` from examples/prototyping/machine-iterators.py
+(prepend the value to the history and trim it) for comparison.
+On MicroPython, also reports the bytes allocated per sample.
+"""
+
+from itiot import window
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+    ticks_us = lambda: int(perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+try:
+    from gc import mem_alloc, collect
+except ImportError:
+    mem_alloc = collect = lambda: 0  # plain python
+
+class average(object):
+    def __init__(self, n):
+        self.n = n
+        self.history = []
+    def process(self, value):
+        self.history = [value] + self.history[:self.n-1]
+        return sum(self.history) / len(self.history)
+
+def measure(element, samples):
+    collect()
+    allocated = mem_alloc()
+    start = ticks_us()
+    for i in range(samples):
+        element.process(i & 4095)  # ADC-like readings
+    elapsed = ticks_diff(ticks_us(), start)
+    return samples * 1000000 / max(elapsed, 1), (mem_alloc() - allocated) / samples
+
+def run(sizes=(8, 32, 128), samples=5000):
+    elements = (('list', average),
+                ('Mean', lambda n: window.Mean(n, typecode='H')),
+                ('Min', lambda n: window.Min(n, typecode='H')),
+                ('Variance', lambda n: window.Variance(n, typecode='H')),
+                ('Median', lambda n: window.Median(n, typecode='H')),
+                ('EMA', lambda n: window.EMA(2 / (n + 1))))
+    print('%6s %10s %16s %12s' % ('size', 'element', 'samples/s', 'bytes/sample'))
+    for n in sizes:
+        for name, make in elements:
+            rate, allocated = measure(make(n), samples)
+            print('%6s %10s %16d %12.1f' % (n, name, rate, allocated))
+
+run()
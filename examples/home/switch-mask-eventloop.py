@@ -1,4 +1,4 @@
-from itiot import http, network
+from itiot import http, network, ota, series, window
 import machine
 import dht
 import uasyncio
@@ -9,57 +9,6 @@ import ulogging
 ulogging.basicConfig(level=ulogging.DEBUG)
 log = ulogging.getLogger(__name__)
 
-def cache(timeout=2):
-    """
-    Minimalistic cache decorator.
-    """
-    # from https://stackoverflow.com/a/53918439/1300775
-    cache = dict()
-    def wrapper(f):
-        def wrapped(*args, **kwargs):
-            key = args + tuple((k,v) for k,v in kwargs.items())
-            result, stamp = cache.get(key, (None, None))
-            print('CACHE lookup', f, result, timeout, time.time(), stamp)
-            if stamp is not None and time.time() - stamp < timeout:
-                print('CACHE hit   ', f, result, timeout, time.time(), stamp)
-                return result
-            else:
-                result = f(*args, **kwargs)
-                cache[key] = result, time.time()
-                print('CACHE save  ', f, result, timeout, time.time())
-                return result
-        return wrapped
-    return wrapper
-
-# def average(size=10):
-#     """
-#     Average decorator.
-#     """
-#     history = []
-#     print(history)
-#     def wrapper(f):
-#         print(history)
-#         def wrapped(*args, **kwargs):
-#             print(history)
-#             result = f(*args, **kwargs)
-#             history.insert(0, result)
-#             history =  history[:size]
-#             return sum(history) / len(history)
-#         return wrapped
-#     return wrapper
-
-class average(object):
-    def __init__(self, size=10):
-        self.size = size
-        self.history = []
-    def __call__(self, f):
-        def wrapped(*args, **kwargs):
-            result = f(*args, **kwargs)
-            self.history.insert(0, result)
-            self.history = self.history[:self.size]
-            return sum(self.history) / len(self.history)
-        return wrapped
-
 class Indicator(object):
 
     def __init__(self, pin:int, invert=False):
@@ -172,6 +121,7 @@ class Presence(object):
             log.info('Presence sensor changed: from %s to %s' % (last_reading, self.reading))
         if last_detected != self.detected:
             log.info('Presence state changed: from %s to %s' % (last_detected, self.detected))
+            events.publish('presence', self.detected)
 
     async def run(self):
         while True:
@@ -207,6 +157,7 @@ class TouchSwitch(Switch):
             idle = time.ticks_diff(time.ticks_ms(), self.last_touched)
             if reading < self.threshold and (idle > self.debounce * 1000 or idle < 0):
                 self.toggle()
+                events.publish('switch/%s' % switches.index(self), 'ON' if self.state else 'OFF')
                 log.info('%s touched %s pin=%s state=%s reading=%s<%s idle=%sms' %(self, self.touch, self.pin, self.state, reading, self.threshold, idle))
                 self.last_touched = time.ticks_ms()
                 # FIXME: use pub/sub for touch event ?
@@ -265,6 +216,17 @@ pins = {
     'dht': dht.DHT22(machine.Pin(4))}
 pins['smoke'].atten(machine.ADC.ATTN_0DB)  # https://docs.micropython.org/en/latest/esp32/quickref.html#ADC.atten
 pins['temperature'].atten(machine.ADC.ATTN_11DB)  # https://docs.micropython.org/en/latest/esp32/quickref.html#ADC.atten
+smoothing = {  # raw readings averaged on the last 16 readings, sampled by smoke_handler
+    'smoke': window.Mean(16, partial=True, typecode='H'),
+    'temperature': window.Mean(16, partial=True, typecode='H')}
+
+def smoothed(name):
+    """
+    Return the current mean of the readings of `name`, without adding
+    a reading (only smoke_handler samples), or None before the first one.
+    """
+    mean = smoothing[name]
+    return mean.result() if mean.count else None
 
 presence = Presence(35)#, timeout=10)
 switches = [TouchSwitch(n) for n in (13, 12, 14)] + [Switch()]
@@ -294,37 +256,59 @@ async def smoke_handler():
     while True:
         unhealthy = 0.7
         danger = 0.9
+        for name in ('smoke', 'temperature'):
+            smoothing[name].process(pins[name].read())
         reading = smoke()
+        history['smoke'].append(time.time(), reading)
+        history['temperature'].append(time.time(), temperature())
         ratio = reading#(max(unhealthy, min(reading, danger)) - unhealthy) / 1/(danger-unhealthy)
         print('Smoke', reading, ratio)
         # indicator.to(r=ratio)
         onboard.to(ratio)
         await uasyncio.sleep(1)
 
+dht_reading = {'temperature': None, 'humidity': None, 'error': 'No measure yet'}
+
+# readings kept on flash while offline, drained with GET /history/<name>,
+# written to flash a page at a time, at least every minute
+history = {
+    'smoke': series.Series('history/smoke', format='<If', records=1024, interval=60),
+    'temperature': series.Series('history/temperature', format='<If', records=1024, interval=60),
+    'dht': series.Series('history/dht', format='<Iff', records=512, interval=60)}
+
+async def dht_handler():
+    # DHT22.measure() blocks for a while: measure here, in its own task,
+    # rather than in the /dht request handler
+    pin = pins['dht']
+    while True:
+        try:
+            pin.measure()
+            dht_reading.update(temperature=pin.temperature(), humidity=pin.humidity(), error=None)
+            history['dht'].append(time.time(), dht_reading['temperature'], dht_reading['humidity'])
+        except Exception as e:
+            dht_reading['error'] = '%s: %s' % (e.__class__.__name__, str(e))
+        await uasyncio.sleep(3)
+
 async def network_handler():
-    ip = '192.168.0.254'
-    ssid = 'Wifi "Bel-Air"'
-    psk = 'Corpataux39'
-    import network
-    # FIXME: should not block to let other tasks run while connecting to wifi
-    nic = network.WLAN(network.STA_IF)
-    nic.active(True)
-    nic.connect(ssid, psk)
-    while not nic.isconnected():
-        print('Waiting for network on', nic)
-        await uasyncio.sleep(1)
-    if ip:
-        nic.ifconfig([ip] + list(nic.ifconfig()[1:]))
-    print('Network connected:', nic.ifconfig())
+    # connects in the background and reconnects when the link drops,
+    # while the other tasks keep running
+    supervisor = network.Supervisor(
+        network.Wifi(), 'Wifi "Bel-Air"', 'Corpataux39', ip='192.168.0.254',
+        on_connect=lambda supervisor: events.publish('network', True),
+        on_disconnect=lambda supervisor: events.publish('network', False))
+    await supervisor.run()
 
 async def api_handler():
-    await uasyncio.start_server(http.Asyncio(app).serve, '0.0.0.0', 80)
+    server = http.Asyncio(app)
+    server.limit = 8  # each /events subscriber holds a connection
+    await uasyncio.start_server(server.serve, '0.0.0.0', 80)
 
 
 app = http.App(__name__)
 # app.debug = True
+events = http.Events()  # state changes pushed to /events subscribers
 
-@app.route('/')
+@app.route('/', sliced=True, cache=2)
 def index():
     values = {}
     for route, callback in app.endpoints.items():
@@ -335,6 +319,7 @@ def index():
             except Exception as e:
                 print('CALL FAIL!', route, callback, e.__class__.__name__, e)
                 values[route] = e
+            yield  # let other tasks run between sensor reads
     return json.dumps(values)
 
 @app.route('/uptime')
@@ -343,25 +328,30 @@ def uptime():
 
 @app.route('/smoke')
 def smoke():
-    return pins['smoke'].read() / 4095
+    reading = smoothed('smoke')
+    return None if reading is None else reading / 4095
 
 @app.route('/temperature')
 def temperature():
-    reading = pins['temperature'].read()
+    reading = smoothed('temperature')
+    if reading is None:
+        return None
     voltage = reading / 4095 * 3.6
     temperature = (voltage - 0.5) / 0.01
     return temperature
 
+@app.route('/history/:name', request=True)
+def history_records(name, request):
+    if name not in history:
+        raise http.HTTPException('No history for %s' % name, status=404)
+    return history[name].respond(request)
+
 @app.route('/dht')
-@cache(3)
 def dht_all():
-    pin = pins['dht']
-    try:
-        pin.measure()
-        return json.dumps({'temperature': pin.temperature(),
-                           'humidity': pin.humidity()})
-    except Exception as e:
-        raise http.HTTPException('%s: %s' % (e.__class__.__name__, str(e)), status=500)
+    if dht_reading['error']:
+        raise http.HTTPException(dht_reading['error'], status=500)
+    return json.dumps({'temperature': dht_reading['temperature'],
+                       'humidity': dht_reading['humidity']})
 
 @app.route('/dht/temperature')
 def dht_temperature():
@@ -383,20 +373,34 @@ def get_switch(id):
 def get_switches():
     return json.dumps({id: get_switch(id) for id in range(len(switches))})
 
-@app.route('/switch/:id', methods=['POST'])
-def set_switch(id):
+@app.route('/switch/:id', methods=['POST'], request=True)
+def set_switch(id, request):
     switch = switches[int(id)]
-    value = app.request.body
+    value = request.body
     log.info('Setting switch %s to %s' % (id, value))
     switch.state = True if value.lower()=='on' else False
+    events.publish('switch/%s' % id, get_switch(id))
     return get_switch(id)
 
+@app.route('/events')
+def api_events():
+    return http.EventStream(events)
+
+# receive updates over Wi-Fi, eg. with OTA_HOST=192.168.0.254 OTA_TOKEN=<token> ./mcu ota,
+# with the same token in file ota.token on the MCU (eg. ./mcu copy ota.token ota.token)
+try:
+    with open('ota.token') as f:
+        ota.Receiver(token=f.read().strip()).register(app)
+except OSError:
+    print('OTA updates disabled: no file ota.token')
+
 switches[2].state = True
 try:
     loop = uasyncio.get_event_loop()
     loop.create_task(switches_handler())
     loop.create_task(presence_handler())
     loop.create_task(smoke_handler())
+    loop.create_task(dht_handler())
     loop.create_task(network_handler())
     loop.create_task(api_handler())
     loop.run_forever()
@@ -1,27 +1,9 @@
-from itiot import http, network
+from itiot import http, network, cache
 import machine
 import dht
 import json
 
-def cache(timeout=2):
-    # from https://stackoverflow.com/a/53918439/1300775
-    import time
-    cache = dict()
-    def wrapper(f):
-        def wrapped(*args, **kwargs):
-            key = args + tuple((k,v) for k,v in kwargs.items())
-            result, stamp = cache.get(key, (None, None))
-            print('CACHE lookup', f, result, timeout, time.time(), stamp)
-            if stamp is not None and time.time() - stamp < timeout:
-                print('CACHE hit   ', f, result, timeout, time.time(), stamp)
-                return result
-            else:
-                result = f(*args, **kwargs)
-                cache[key] = result, time.time()
-                print('CACHE save  ', f, result, timeout, time.time())
-                return result
-        return wrapped
-    return wrapper
+dht_cache = cache.Cache(ttl=3, size=1)
 
 app = http.App(__name__)
 # app.debug = True
@@ -60,7 +42,7 @@ def temperature():
     return temperature
 
 @app.route('/dht')
-@cache(3)
+@dht_cache.memoize
 def dht_all():
     pin = pins['dht']
     try:
@@ -86,10 +68,10 @@ def get_switch(id):
 def get_switches():
     return json.dumps({id: get_switch(id) for id in range(len(pins['switch']))})
 
-@app.route('/switch/:id', methods=['POST'])
-def set_switch(id):
+@app.route('/switch/:id', methods=['POST'], request=True)
+def set_switch(id, request):
     pin = pins['switch'][int(id)]
-    value = app.request.body
+    value = request.body
     print('Setting %s to %s' % (pin, value))
     pin.value(True if value.lower()=='on' else False)
     return get_switch(id)
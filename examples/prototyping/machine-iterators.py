@@ -51,8 +51,9 @@ def onchange(g, delta=0.1, absolute=True, lastvalue=None):
     Yield value only when difference with last value is equal or greater than `delta`.
     """
     for value in g:
-        difference = value - lastvalue
-        if (abs(difference) if absolute else difference) >= abs(delta):
+        difference = value - (value if lastvalue is None else lastvalue)
+        if lastvalue is None or (abs(difference) if absolute else difference) >= abs(delta):
+            lastvalue = value
             yield value
 
 def consume(g, period=0.2, value=None):
@@ -130,14 +131,34 @@ def ex3():
     Pipe n:1 - read 2 sensors and update 1 led with average value.
     """
     # cf. basic-python-iterators.py
-    pass
+    from itiot.pipe import Pipe, Normalize, Update
+    from itiot.topology import Zip
+    touches = [machine.TouchPad(machine.Pin(n)) for n in (13, 12)]
+    led = machine.PWM(machine.Pin(5))
+    pipe = Pipe(Zip(*touches, f=lambda *values: sum(values) / len(values)),
+                Normalize(max=1023),
+                Update(led, write=lambda pwm, value: pwm.duty(int(value*1023))))
+    for _ in pipe:
+        pass
 
 def ex4():
     """
     Pipe 1:n - read 1 sensor and update 2 leds, inverting value for 1 of the 2 leds.
     """
     # cf. basic-python-iterators.py
-    pass
+    from itiot.pipe import Pipe, Apply, Normalize, Update
+    from itiot.scheduler import Scheduler
+    from itiot.topology import Tee
+    import uasyncio
+    touch = machine.TouchPad(machine.Pin(4))
+    leds = [machine.PWM(machine.Pin(n)) for n in (5, 18)]
+    duty = lambda pwm, value: pwm.duty(int(value*1023))
+    tee = Tee(Pipe(touch, Normalize(max=1023)), n=2)
+    scheduler = Scheduler()
+    scheduler.add(tee, period=0.05)
+    scheduler.add(Pipe(tee.branches[0], Update(leds[0], write=duty)), period=0.05)
+    scheduler.add(Pipe(tee.branches[1], Apply(lambda value: 1 - value), Update(leds[1], write=duty)), period=0.5)
+    uasyncio.get_event_loop().run_until_complete(scheduler.run())
 
 def ex5():
     """
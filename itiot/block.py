@@ -0,0 +1,107 @@
+"""
+Pipe elements processing blocks of samples, eg.
+
+    pipe = Pipe(Block(adc, size=64), Mean(), Normalize(max=4095))
+
+A `Block` source reads `size` samples at once into a preallocated array
+and passes the whole block downstream. Blocks pay off when reduced (eg. `Mean`):
+downstream elements then run once per block instead of once per sample
+(see examples/benchmarks/pipe-block.py); mapping samples is not faster.
+Block elements reuse their output array: a block is only valid until
+the next read of the pipe.
+Their loops are compiled to machine code (@micropython.native) with a
+firmware with the native emitter (ESP32: v1.12 or later) and mpy-cross
+`-march` (eg. MPY_CROSS_FLAGS=-march=xtensawin, see mcu); otherwise
+toolchain/build.py drops the decorators and they run as bytecode.
+"""
+
+from array import array
+
+from itiot.pipe import Source, Element
+
+try:
+    import micropython
+except ImportError:
+    class micropython(object):  # plain python
+        native = staticmethod(lambda f: f)
+
+class Block(Source):
+    """
+    Read blocks of `size` samples from `obj` (eg. a machine.ADC) into an array
+    of `typecode`, with function `read` (default: `obj.read()`).
+    With a `timer` and an `obj` supporting it (eg. pyb.ADC), samples are
+    read at the timer frequency with `obj.read_timed`.
+    """
+    __slots__ = ('obj', 'reader', 'timer', 'buffer')
+
+    def __init__(self, obj, size=32, read=None, timer=None, typecode='H'):
+        self.obj = obj
+        self.reader = obj.read if read is None else lambda: read(obj)
+        self.timer = timer if hasattr(obj, 'read_timed') else None
+        self.buffer = array(typecode, [0] * size)
+
+    @micropython.native
+    def read(self):
+        if self.timer is not None:
+            self.obj.read_timed(self.buffer, self.timer)
+            return self.buffer
+        buffer, reader = self.buffer, self.reader
+        for i in range(len(buffer)):
+            buffer[i] = reader()
+        return buffer
+
+class Normalize(Element):
+    """
+    Normalize samples in range `min`..`max` to the range 0..1.
+    """
+    __slots__ = ('min', 'scale', 'output')
+
+    def __init__(self, max, min=0):
+        self.min = min
+        self.scale = 1 / (max - min)
+        self.output = array('f')
+
+    @micropython.native
+    def process(self, block):
+        output = self.output
+        if len(output) != len(block):
+            self.output = output = array('f', [0] * len(block))
+        low, scale = self.min, self.scale
+        for i in range(len(block)):
+            output[i] = (block[i] - low) * scale
+        return output
+
+class Boolean(Element):
+    """
+    Convert samples to 1 if greater or equal than `threshold`, else 0.
+    """
+    __slots__ = ('threshold', 'output')
+
+    def __init__(self, threshold=0.5):
+        self.threshold = threshold
+        self.output = array('B')
+
+    @micropython.native
+    def process(self, block):
+        output = self.output
+        if len(output) != len(block):
+            self.output = output = array('B', [0] * len(block))
+        threshold = self.threshold
+        for i in range(len(block)):
+            output[i] = block[i] >= threshold
+        return output
+
+class Mean(Element):
+    """
+    Reduce blocks to the mean of their samples.
+    """
+    __slots__ = ()
+
+    @micropython.native
+    def process(self, block):
+        total = 0
+        for value in block:
+            total += value
+        return total / len(block)
+
+Average = Mean
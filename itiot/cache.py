@@ -0,0 +1,149 @@
+"""
+Cache with time to live and least recently used eviction.
+"""
+
+try:
+    from ucollections import OrderedDict
+except ImportError:
+    from collections import OrderedDict  # plain python
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio  # plain python
+
+try:
+    from time import ticks_ms, ticks_add, ticks_diff
+except ImportError:
+    from time import time  # plain python
+    ticks_ms = lambda: int(time() * 1000)
+    ticks_add = lambda a, b: a + b
+    ticks_diff = lambda a, b: a - b
+
+missing = object()
+
+def sizeof(value):
+    """
+    Estimate the memory used by `value`, in bytes.
+    """
+    if hasattr(value, 'body'):  # http.Response
+        return 128 + sizeof(value.body)
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    return 16
+
+class Pending(object):
+    """
+    Value being computed by `Cache.acall`, with `ready` (an asyncio.Event)
+    set when computed: tasks waiting for it get the `value` or the `error`.
+    """
+    __slots__ = ('ready', 'value', 'error')
+
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.value = None
+        self.error = None
+
+class Cache(object):
+    """
+    Cache values for `ttl` seconds, keeping at most `size` values and
+    `budget` bytes (estimated with `sizeof`): beyond, the least recently
+    used values are evicted.
+
+    Use `call` and `acall` to compute missing values, or decorate functions
+    with `memoize` and coroutines with `amemoize`. Concurrent `acall`
+    on the same key compute the value once, the others waiting for it
+    (and getting its exception, if computing it failed).
+    """
+
+    def __init__(self, ttl=2, size=8, budget=None, clock=ticks_ms):
+        self.ttl = ttl
+        self.size = size
+        self.budget = budget
+        self.clock = clock
+        self.entries = OrderedDict()  # key: (value, expiry ticks, size in bytes)
+        self.pending = {}  # key: Pending, for keys being computed by acall
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entry = self.entries.pop(key, None)
+        if entry is not None and ticks_diff(entry[1], self.clock()) > 0:
+            self.entries[key] = entry  # most recently used last
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            self.used -= entry[2]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        self.delete(key)
+        size = sizeof(value)
+        expiry = ticks_add(self.clock(), int((self.ttl if ttl is None else ttl) * 1000))
+        self.entries[key] = value, expiry, size
+        self.used += size
+        while self.entries and (len(self.entries) > self.size or
+                                self.budget is not None and self.used > self.budget):
+            self.delete(next(iter(self.entries)))
+            self.evictions += 1
+
+    def delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.used -= entry[2]
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.used = 0
+
+    def call(self, key, f, *args, ttl=None, **kwargs):
+        """
+        Return the value for `key`, calling `f(*args, **kwargs)` to compute it if missing.
+        """
+        value = self.get(key, missing)
+        if value is missing:
+            value = f(*args, **kwargs)
+            self.set(key, value, ttl)
+        return value
+
+    async def acall(self, key, f, *args, ttl=None, **kwargs):
+        """
+        Return the value for `key`, awaiting `f(*args, **kwargs)` to compute it if missing,
+        or waiting for the task already computing it.
+        """
+        pending = self.pending.get(key)
+        if pending is not None:
+            await pending.ready.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+        value = self.get(key, missing)
+        if value is missing:
+            pending = self.pending[key] = Pending()
+            try:
+                value = pending.value = await f(*args, **kwargs)
+                self.set(key, value, ttl)
+            except Exception as e:
+                pending.error = e
+                raise
+            finally:
+                del self.pending[key]
+                pending.ready.set()
+        return value
+
+    def memoize(self, f):
+        def wrapped(*args, **kwargs):
+            return self.call(args + tuple(sorted(kwargs.items())), f, *args, **kwargs)
+        return wrapped
+
+    def amemoize(self, f):
+        async def wrapped(*args, **kwargs):
+            return await self.acall(args + tuple(sorted(kwargs.items())), f, *args, **kwargs)
+        return wrapped
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.used}
@@ -2,9 +2,29 @@
 Micro HTTP framework.
 """
 
-import ure
 import json
 
+import time
+
+try:
+    from ubinascii import crc32
+except ImportError:
+    from binascii import crc32  # plain python
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio  # plain python, eg. for benchmarks
+
+try:
+    import usocket
+    import uselect
+    import uerrno as errno
+except ImportError:
+    import socket as usocket  # plain python, eg. for benchmarks
+    import select as uselect
+    import errno
+
 statuses = {
     # from https://stackoverflow.com/questions/36528175, https://cdn.unreal-designs.co.uk/cont/statusMsg/
 	"1": ("Information", ""),
@@ -79,6 +99,42 @@ class HTTPException(Exception):
         self.status = status
 
 class Request(object):
+    """
+    HTTP request, parsed incrementally from a stream (`aread`)
+    or from a buffer of bytes (`parse`).
+
+    Header lines are checked and kept raw, and parsed on first access of
+    `headers` (with lower-case names). The body is exposed as `data`, a memoryview
+    on the received bytes: it is not copied, decode it with `body`.
+    """
+
+    limit = 2048  # maximum size of request line and headers, in bytes
+    body_limit = 16384  # maximum size of body, in bytes
+
+    method = None
+    path = None
+    query = ''
+    protocol = None
+
+    def __init__(self, bites=None):
+        self.lines = []
+        self.parsed = None
+        self.data = memoryview(b'')
+        if bites is not None:
+            self.parse(bites)
+
+    @property
+    def headers(self):
+        if self.parsed is None:
+            self.parsed = {}
+            for line in self.lines:
+                k, v = bytes(line).decode().split(':', 1)
+                self.parsed[k.strip().lower()] = v.strip()
+        return self.parsed
+
+    @property
+    def body(self):
+        return bytes(self.data).decode()
 
     @property
     def json(self):
@@ -87,40 +143,244 @@ class Request(object):
         except Exception as e:
             raise HTTPException('Invalid JSON (%s)'%e, status=400)
 
-    def __init__(self, bites):
-        bang, *content = bites.decode().splitlines()
-        self.method, self.path, self.protocol = bang.split()
-        self.body = ''.join(content[1+content.index(''):])
-        self.headers = {}
-        for header in content[:content.index('')]:
-            k, v = header.split(':', 1)
-            self.headers[k.strip()] = v.strip()
+    def start(self, line):
+        """
+        Parse the request line, eg. 'GET /path?query HTTP/1.1'.
+        """
+        try:
+            self.method, target, self.protocol = bytes(line).decode().split()
+        except ValueError:
+            raise HTTPException('Invalid request line', status=400)
+        self.path, *query = target.split('?', 1)
+        self.query = query[0] if query else ''
+
+    def parse(self, bites):
+        """
+        Parse a complete request from `bites`, the body being a slice of it.
+        """
+        buffer = memoryview(bites)
+        head = bytes(buffer[:self.limit])
+        end = head.find(b'\r\n\r\n')
+        if end < 0:
+            if len(buffer) >= self.limit:
+                raise HTTPException('Request header fields too large', status=431)
+            end = len(head)
+        start = 0
+        while start < end:
+            stop = head.find(b'\r\n', start, end)
+            stop = end if stop < 0 else stop
+            if self.method is None:
+                self.start(buffer[start:stop])
+            elif stop > start:
+                if head.find(b':', start, stop) < 0:
+                    raise HTTPException('Invalid header line', status=400)
+                self.lines.append(buffer[start:stop])
+            start = stop + 2
+        self.data = buffer[end+4:]
+
+    async def aread(self, reader):
+        """
+        Read the request line, the headers and a Content-Length framed body
+        from a stream `reader`, returning False if the stream is at EOF.
+        """
+        line = await reader.readline()
+        if not line:
+            return False
+        self.start(line)
+        size = len(line)
+        length = 0
+        while True:
+            line = await reader.readline()
+            size += len(line)
+            if size > self.limit:
+                raise HTTPException('Request header fields too large', status=431)
+            if not line.strip():
+                break
+            if b':' not in line:
+                raise HTTPException('Invalid header line', status=400)
+            if line[:15].lower() == b'content-length:':
+                length = self.length(line[15:])
+            self.lines.append(line.rstrip())
+        if length > self.body_limit:
+            raise HTTPException('Request body too large', status=413)
+        if length:
+            self.data = memoryview(await reader.readexactly(length))
+        return True
+
+    @staticmethod
+    def length(value):
+        """
+        Return the int of Content-Length `value` (bytes), raising HTTPException if invalid.
+        """
+        try:
+            length = int(bytes(value).decode())
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPException('Invalid Content-Length', status=400)
+        return length
+
+    @classmethod
+    def size(cls, buffer):
+        """
+        Return the size of the request at the start of `buffer`
+        if it is complete (headers and Content-Length body), or None.
+        """
+        head = bytes(buffer[:cls.limit])
+        end = head.find(b'\r\n\r\n')
+        if end < 0:
+            if len(buffer) >= cls.limit:
+                raise HTTPException('Request header fields too large', status=431)
+            return None
+        length = 0
+        start = head.lower().find(b'\r\ncontent-length:', 0, end)
+        if start >= 0:
+            length = cls.length(head[start+17:head.find(b'\r\n', start+2)])
+        if length > cls.body_limit:
+            raise HTTPException('Request body too large', status=413)
+        size = end + 4 + length
+        return size if len(buffer) >= size else None
 
     def __str__(self):
         return '%s %s' % (self.method, self.path)
 
 class Response(object):
+    """
+    HTTP response, written in chunks by `chunks` (or `awrite`):
+    the status line and headers, then the body.
+
+    The body can be str, bytes, a generator of str or bytes,
+    or a file object: generators and files are streamed chunk by chunk,
+    without the whole body ever being in memory, and are sent without
+    Content-Length unless the headers give it.
+    """
 
+    protocol = 'HTTP/1.0'
     status = None
     headers = {
         'Server': 'mask/0.0.0',
         'Content-Type': 'text/plain'}
     body = b''
+    chunk = 512  # size of the buffer for reading file bodies, in bytes
+    chunked = False
 
     def __init__(self, body=None, status=200, headers={}):
         self.status = int(status)
-        if body is not None:
-            self.body = str(body)
-        else:
-            self.body = ': '.join(filter(bool, ((str(status),) + getstatus(status))))
+        if body is None:
+            body = ': '.join(filter(bool, ((str(status),) + getstatus(status))))
+        if isinstance(body, str):
+            body = body.encode()
+        elif not isinstance(body, (bytes, bytearray, memoryview)) and not self.streamed(body):
+            body = str(body).encode()
+        self.body = body
         self.headers = dict(dict({}, **Response.headers), **headers)
-        self.headers['Content-Length'] = len(self.body)
+        if not self.streamed(body):
+            self.headers['Content-Length'] = len(body)
+
+    @staticmethod
+    def streamed(body):
+        return hasattr(body, 'read') or hasattr(body, 'send')
+
+    def head(self):
+        """
+        Return the status line and headers as a buffer of bytes.
+        """
+        head = bytearray(('%s %s %s\r\n' % (self.protocol, self.status, getstatus(self.status)[0])).encode())
+        for k, v in self.headers.items():
+            head.extend(('%s: %s\r\n' % (k, v)).encode())
+        head.extend(b'\r\n')
+        return head
+
+    def chunks(self):
+        """
+        Generate the response as chunks of bytes: the head, then the body
+        (with chunked transfer coding if `self.chunked`).
+        Chunks of file bodies share one buffer: send each chunk before the next.
+        """
+        head = self.head()
+        if not self.chunked and not self.streamed(self.body) and len(self.body) <= self.chunk:
+            # one write for a small response: a second small segment would wait
+            # for the ack of the first (Nagle), that clients delay (delayed ack)
+            head.extend(self.body)
+            yield head
+            return
+        yield head
+        for chunk in self.content():
+            if not self.chunked:
+                yield chunk
+            elif len(chunk):
+                yield ('%x\r\n' % len(chunk)).encode()
+                yield chunk
+                yield b'\r\n'
+        if self.chunked:
+            yield b'0\r\n\r\n'
+
+    def content(self):
+        """
+        Generate the body as chunks of bytes.
+        """
+        body = self.body
+        if hasattr(body, 'read'):
+            try:
+                if hasattr(body, 'readinto'):
+                    buffer = bytearray(self.chunk)
+                    view = memoryview(buffer)
+                    while True:
+                        n = body.readinto(buffer)
+                        if not n:
+                            break
+                        yield view[:n]
+                else:
+                    while True:
+                        chunk = body.read(self.chunk)
+                        if not chunk:
+                            break
+                        yield chunk.encode() if isinstance(chunk, str) else chunk
+            finally:
+                body.close()
+        elif hasattr(body, 'send'):
+            for chunk in body:
+                yield chunk if isinstance(chunk, (bytes, bytearray, memoryview)) else str(chunk).encode()
+        elif body:
+            yield body
+
+    def persist(self, request, alive=True):
+        """
+        Set protocol and Connection header for answering `request`,
+        returning True if the connection can be kept alive afterwards:
+        HTTP/1.1 connections persist unless closed by client (streamed bodies
+        are then sent with chunked transfer coding), HTTP/1.0 connections
+        only on client demand and if the body has a Content-Length.
+        """
+        connection = request.headers.get('connection', '').lower()
+        framed = 'Content-Length' in self.headers or self.status in (204, 304)
+        if request.protocol == 'HTTP/1.1':
+            self.protocol = 'HTTP/1.1'
+            alive = alive and connection != 'close'
+            if alive and not framed:
+                self.headers['Transfer-Encoding'] = 'chunked'
+                self.chunked = True
+        else:
+            alive = alive and connection == 'keep-alive' and framed
+        self.headers['Connection'] = 'keep-alive' if alive else 'close'
+        return alive
+
+    async def awrite(self, writer):
+        """
+        Write the response to a uasyncio stream `writer`, chunk by chunk.
+        """
+        for chunk in self.chunks():
+            await awrite(writer, chunk)
 
     def __str__(self):
-        s = 'HTTP/1.0 %s %s\r\n' % (self.status, getstatus(self.status)[0])
-        s += ''.join(['%s: %s\r\n' % (k, v) for k, v in self.headers.items()])
-        s += '\r\n%s\r\n' % self.body
-        return s
+        if self.streamed(self.body):
+            body = '<%s>' % self.body.__class__.__name__
+        else:
+            try:
+                body = bytes(self.body).decode()
+            except UnicodeError:
+                body = repr(bytes(self.body))
+        return self.head().decode() + body
 
 # class JsonResponse(Reponse)
 #     def __init__(self, *args, **kwargs):
@@ -129,6 +389,149 @@ class Response(object):
 # 		if 'Content-Type' not in self.headers:
 # 			self.headers['Content-Type'] = 'application/json'
 
+class Events(object):
+    """
+    Events published by state change hooks, eg. `events.publish('presence', True)`,
+    queued for each subscriber (at most `size` events, older ones are dropped).
+    The last data of each event is kept for new subscribers.
+    """
+
+    size = 8
+
+    def __init__(self):
+        self.subscribers = []
+        self.last = {}
+
+    def publish(self, event, data):
+        self.last[event] = data
+        for subscription in self.subscribers:
+            if len(subscription.queue) >= self.size:
+                subscription.queue.pop(0)
+            subscription.queue.append((event, data))
+            subscription.ready.set()
+
+    def subscribe(self):
+        subscription = Subscription(self.last.items())
+        self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.remove(subscription)
+
+class Subscription(object):
+    """
+    Events queued for one subscriber, with `ready` (an asyncio.Event, uasyncio v3:
+    firmware v1.13 or later) set when events are queued, so that the subscriber
+    sleeps until then.
+    """
+
+    def __init__(self, events=()):
+        self.queue = list(events)
+        self.ready = asyncio.Event()
+        if self.queue:
+            self.ready.set()
+
+class EventStream(Response):
+    """
+    Server-Sent Events response, pushing `events` (an Events) as they are
+    published, until the client disconnects, eg.
+    `@app.route('/events') def stream(): return http.EventStream(events)`.
+
+    Each subscriber holds a connection: raise the socket `limit` accordingly.
+    Sync sockets (Poll, Timer) cannot wait for events: they answer the
+    last data of each event and the client reconnects after `retry`.
+    """
+
+    heartbeat = 15  # seconds between comments sent to detect disconnected clients
+    retry = 3  # seconds before clients reconnect
+
+    def __init__(self, events, status=200, headers={}):
+        super().__init__(b'', status, dict({
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache'}, **headers))
+        self.events = events
+        self.body = None
+
+    @staticmethod
+    def streamed(body):
+        return True
+
+    @staticmethod
+    def format(event, data):
+        return ('event: %s\ndata: %s\n\n' % (event, json.dumps(data))).encode()
+
+    def persist(self, request, alive=True):
+        return super().persist(request, alive=False)
+
+    def content(self):
+        yield ('retry: %d\n\n' % (self.retry * 1000)).encode()
+        for event, data in self.events.last.items():
+            yield self.format(event, data)
+
+    async def awrite(self, writer):
+        subscription = self.events.subscribe()
+        try:
+            await awrite(writer, self.head())
+            await awrite(writer, ('retry: %d\n\n' % (self.retry * 1000)).encode())
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    await awrite(writer, b':\n\n')
+                    continue
+                subscription.ready.clear()
+                while subscription.queue:
+                    await awrite(writer, self.format(*subscription.queue.pop(0)))
+        except OSError:
+            pass  # client disconnected
+        finally:
+            self.events.unsubscribe(subscription)
+
+async def awrite(writer, data):
+    """
+    Write `data` to a stream `writer`, from uasyncio or asyncio (plain python).
+    """
+    if hasattr(writer, 'awrite'):
+        await writer.awrite(data)
+    else:
+        writer.write(data)
+        await writer.drain()
+
+async def aclose(writer):
+    """
+    Close a stream `writer`, from uasyncio or asyncio (plain python).
+    """
+    try:
+        if hasattr(writer, 'aclose'):
+            await writer.aclose()
+        else:
+            writer.close()
+            await writer.wait_closed()
+    except OSError:
+        pass  # client disconnected, eg. from an event stream
+
+def slices(generator):
+    """
+    Run `generator` at once and return its return value.
+    """
+    try:
+        while True:
+            next(generator)
+    except StopIteration as e:
+        return e.value
+
+async def aslices(generator):
+    """
+    Run `generator` in cooperative time slices and return its return value:
+    the event loop runs other tasks at each yield of `generator`,
+    for the number of seconds yielded (or just one round if None).
+    """
+    try:
+        while True:
+            await asyncio.sleep(next(generator) or 0)
+    except StopIteration as e:
+        return e.value
+
 class Socket(object):
 
     def __init__(self, app):
@@ -138,106 +541,527 @@ class Socket(object):
         raise NotImplementedError('Implement socket handling')
 
 class Asyncio(Socket):
+    """
+    Serve with uasyncio, keeping HTTP/1.1 connections alive between requests.
+    """
+
+    timeout = 10  # seconds to wait for the next request on a connection
+    limit = 4  # maximum number of concurrent connections, more are answered with 503
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.connections = 0
 
     def run(self, host, port):
-        import uasyncio
         try:
-            loop = uasyncio.get_event_loop()
-            loop.create_task(uasyncio.start_server(self.serve, host, port))
+            loop = asyncio.get_event_loop()
+            loop.create_task(asyncio.start_server(self.serve, host, port))
             loop.run_forever()
         finally:
             loop.close()
 
-    def serve(self, reader, writer):
-        request = yield from reader.read()
-        if request:
-            response = str(self.app.handle(request)).encode()
-            yield from writer.awrite(response)
-        yield from writer.aclose()
+    async def serve(self, reader, writer):
+        self.connections += 1
+        try:
+            alive = self.connections <= self.limit
+            if not alive:
+                await Response(status=503, headers={'Connection': 'close'}).awrite(writer)
+            while alive:
+                request = Request()
+                try:
+                    if not await asyncio.wait_for(request.aread(reader), self.timeout):
+                        break
+                    response = await self.app.ahandle(request)
+                    alive = response.persist(request)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPException as e:
+                    response = Response(str(e), e.status, headers={'Connection': 'close'})
+                    alive = False
+                await response.awrite(writer)
+        finally:
+            self.connections -= 1
+            await aclose(writer)
 
-class Timer(Socket):
-    # FIXME: Use socket 'with' statements: https://realpython.com/python-sockets/
-    def run(self, host, port):
-        import usocket
-        import machine
+class Poll(Socket):
+    """
+    Serve with non-blocking sockets and uselect.poll, waking up when
+    sockets are ready: requests are received on several connections
+    at once, until complete, and answered one by one. Responses are sent
+    as far as the socket takes them, the rest when it is ready again
+    (POLLOUT): a slow client does not stall the others.
+    """
+
+    timeout = 10  # seconds to wait for a complete request on a connection
+    limit = 4  # maximum number of concurrent connections, more are answered with 503
+    chunk = 512  # size of socket reads, in bytes
+
+    def listen(self, host, port):
         self.socket = usocket.socket()
-        addr = (host, port)  # FIXME: should use getaddrinfo ?
-        self.socket.bind(addr)
-        self.socket.settimeout(0.1)
-        self.socket.listen(0)
-        self.timer = machine.Timer(-1)
-        self.timer.init(period=1000, callback=lambda t: self.serve())
+        self.socket.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
+        self.socket.bind(usocket.getaddrinfo(host, port)[0][-1])
+        self.socket.listen(self.limit)
+        self.socket.setblocking(False)
+        self.poll = uselect.poll()
+        self.poll.register(self.socket, uselect.POLLIN)
+        self.connections = {}  # socket: [received bytes, time of last activity, response being sent]
+        self.descriptors = {}  # file descriptor: socket, as plain python polls descriptors
+        if hasattr(self.socket, 'fileno'):
+            self.descriptors[self.socket.fileno()] = self.socket
 
-    def serve(self):
+    def run(self, host, port):
+        self.listen(host, port)
+        while True:
+            self.step(1000)
+
+    def step(self, timeout=0):
+        """
+        Serve the ready sockets, waiting at most `timeout` milliseconds
+        for one to be ready, and close connections idle for too long.
+        """
+        for event in self.poll.poll(timeout):
+            conn = self.descriptors.get(event[0], event[0])
+            if conn is self.socket:
+                self.accept()
+                continue
+            try:
+                if event[1] & uselect.POLLOUT:
+                    self.resume(conn)
+                else:
+                    self.receive(conn)
+            except Exception as e:  # eg. a handler bug: drop this connection, serve the others
+                print('Poll: error on connection, closing it:', e.__class__.__name__, e)
+                if conn in self.connections:
+                    self.close(conn)
+        now = time.time()
+        for conn, connection in list(self.connections.items()):
+            if now - connection[1] > self.timeout:
+                self.close(conn)
+
+    def accept(self):
         try:
-            conn, host = self.socket.accept()
-            request = conn.recv(8192)  # FIXME: hitting EOF creates a lag
+            conn, address = self.socket.accept()
         except OSError:
-            return  # expected behavior when socket.accept reaches timeout
-                    # FIXME: catch more specific exception OSError: [Errno 110] ETIMEDOUT ?
-        try:
-            response = str(self.app.handle(request)).encode()
-            conn.sendall(response)
-        # except Exception as e:
-        #     conn.send(('Error: %s: %s'%(e.__class__, __name__, str(e))).encode())
-        finally:
+            return  # connection aborted before accept
+        conn.setblocking(False)
+        if len(self.connections) >= self.limit:
+            try:  # a small response fits in the socket buffer: one send, without waiting
+                conn.send(b''.join(Response(status=503, headers={'Connection': 'close'}).chunks()))
+            except OSError:
+                pass
             conn.close()
+            return
+        self.connections[conn] = [bytearray(), time.time(), None]
+        if hasattr(conn, 'fileno'):
+            self.descriptors[conn.fileno()] = conn
+        self.poll.register(conn, uselect.POLLIN)
+
+    def receive(self, conn):
+        connection = self.connections.get(conn)
+        if connection is None:
+            return
+        try:
+            data = conn.recv(self.chunk)
+        except OSError:
+            data = None  # connection reset
+        if not data:
+            return self.close(conn)
+        connection[0].extend(data)
+        connection[1] = time.time()
+        self.process(conn, connection)
+
+    def process(self, conn, connection):
+        """
+        Answer the complete requests received on `conn`, one by one:
+        the next one when the response to the previous one is sent.
+        """
+        buffer = connection[0]
+        while buffer and connection[2] is None:
+            try:
+                size = Request.size(buffer)
+                if size is None:
+                    return
+                request = Request(memoryview(buffer)[:size])
+                response = self.app.handle(request)
+                alive = response.persist(request)
+            except HTTPException as e:
+                response = Response(str(e), e.status, headers={'Connection': 'close'})
+                size, alive = len(buffer), False
+            buffer = connection[0] = bytearray(buffer[size:])  # the request keeps the former buffer
+            connection[2] = [response.chunks(), memoryview(b''), alive]
+            if not self.send(conn, connection):
+                return
+
+    def send(self, conn, connection):
+        """
+        Send the response being sent on `conn` as far as the socket takes it,
+        returning True when sent and the connection is kept alive. Otherwise,
+        wait for the socket to be ready (POLLOUT) to send the rest, or close it.
+        """
+        sending = connection[2]
+        chunks, pending = sending[0], sending[1]
+        while True:
+            if not len(pending):
+                try:
+                    pending = memoryview(next(chunks))  # chunks of files share a buffer: sent before the next
+                except StopIteration:
+                    break
+                continue
+            try:
+                n = conn.send(pending)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    self.close(conn)  # connection closed by client
+                    return False
+                n = 0
+            if not n:  # socket buffer full
+                sending[1] = pending
+                self.poll.modify(conn, uselect.POLLOUT)
+                return False
+            pending = pending[n:]
+            connection[1] = time.time()
+        connection[2] = None
+        if not sending[2]:
+            self.close(conn)
+            return False
+        return True
+
+    def resume(self, conn):
+        """
+        Send more of the response on `conn`, ready for writing again,
+        then answer the requests received meanwhile.
+        """
+        connection = self.connections.get(conn)
+        if connection is None or connection[2] is None:
+            return
+        if self.send(conn, connection):
+            self.poll.modify(conn, uselect.POLLIN)
+            self.process(conn, connection)
+
+    def close(self, conn):
+        self.connections.pop(conn, None)
+        if hasattr(conn, 'fileno'):
+            self.descriptors.pop(conn.fileno(), None)
+        self.poll.unregister(conn)
+        conn.close()
+
+class Timer(Poll):
+    """
+    Serve like Poll from a machine.Timer, without blocking the main program:
+    ready sockets are served every `period` milliseconds, by the main thread
+    (micropython.schedule) rather than in the timer callback, where handlers
+    could not allocate memory nor block.
+    """
+
+    period = 100
+
+    def run(self, host, port):
+        import machine
+        import micropython
+        self.listen(host, port)
+        step = self.step  # bound once: the timer callback does not allocate
+        def tick(timer):
+            try:
+                micropython.schedule(step, 0)
+            except RuntimeError:
+                pass  # schedule queue full: served next period
+        self.timer = machine.Timer(-1)
+        self.timer.init(period=self.period, callback=tick)
+
+class Client(object):
+    """
+    HTTP/1.1 client keeping one connection to `host`:`port` alive between
+    requests, and reconnecting when the server closed it.
+    """
+
+    timeout = 10  # seconds
+    connect_timeout = 2  # seconds, short not to stall the caller when the server is down
+    chunk = 512  # size of socket reads, in bytes
+
+    def __init__(self, host, port=80):
+        self.host = host
+        self.port = port
+        self.socket = None
+        self.buffer = bytearray()
+        self.connects = 0  # number of connections opened
+
+    def connect(self):
+        self.close()
+        self.socket = usocket.socket()
+        self.socket.settimeout(self.connect_timeout)
+        self.socket.connect(usocket.getaddrinfo(self.host, self.port)[0][-1])
+        self.socket.settimeout(self.timeout)
+        self.connects += 1
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+        self.socket = None
+        self.buffer = bytearray()
+
+    def request(self, method, path, body=b'', headers={}):
+        """
+        Send a request and return the response status, headers (lower-case) and body,
+        raising OSError if the connection failed.
+        """
+        head = '%s %s HTTP/1.1\r\nHost: %s\r\nContent-Length: %d\r\n' % (method, path, self.host, len(body))
+        for k, v in headers.items():
+            head += '%s: %s\r\n' % (k, v)
+        request = head.encode() + b'\r\n' + body
+        for reused in (self.socket is not None, False):
+            if self.socket is None:
+                self.connect()
+            try:
+                self.socket.sendall(request)
+                return self.response()
+            except OSError:
+                self.close()
+                if not reused:  # a kept-alive connection may have been closed by the server: retry once
+                    raise
+
+    def response(self):
+        protocol, status = self.readline().decode().split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            k, v = line.decode().split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+        if 'content-length' in headers:
+            body = self.read(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(self.readline().split(b';')[0], 16)
+                body += self.read(size)
+                self.readline()
+                if not size:
+                    break
+        else:
+            body = self.read(None)  # until closed
+        if protocol != 'HTTP/1.1' or headers.get('connection', '').lower() == 'close' or self.socket is None:
+            self.close()
+        return int(status), headers, body
+
+    def receive(self):
+        data = self.socket.recv(self.chunk)
+        if not data:
+            raise OSError('Connection closed by server')
+        self.buffer.extend(data)
+
+    def readline(self):
+        while b'\r\n' not in self.buffer:
+            self.receive()
+        end = self.buffer.find(b'\r\n')
+        line = bytes(self.buffer[:end])
+        self.buffer = self.buffer[end+2:]
+        return line
+
+    def read(self, size):
+        if size is None:
+            try:
+                while True:
+                    self.receive()
+            except OSError:
+                self.socket.close()
+                self.socket = None
+            size = len(self.buffer)
+        while len(self.buffer) < size:
+            self.receive()
+        data = bytes(self.buffer[:size])
+        self.buffer = self.buffer[size:]
+        return data
 
 class App(object):
+    """
+    HTTP application, routing requests to handlers.
+
+    Handlers are registered with `route`, which takes these options:
+    - `request`: pass the Request to the handler as keyword argument `request`,
+      instead of sharing it between concurrent requests
+    - `coroutine`: the handler is a coroutine (`async def`), awaited by
+      `ahandle` (this cannot be told apart from a generator on micropython)
+    - `sliced`: the handler is a blocking generator function that yields
+      between slices of its work and returns its result, see `aslices`
+    - `cache`: cache responses to GET requests by path for this number of
+      seconds, in `self.cache` (concurrent requests call the handler once)
+
+    If `etag`, responses are tagged with a checksum of their body (except
+    streamed and sliced ones), and requests with a matching If-None-Match
+    are answered with 304.
+    """
 
     name = None
-    endpoints = {}
-    request = None  # FIXME: current request (not concurrent-friendly)
     debug = False
+    etag = True
+    cache = None  # itiot.cache.Cache of responses, created for the first cached route
+    cache_size = 8
+    cache_budget = 8192  # bytes
+
+    def __init__(self, name=None):
+        self.name = name
+        self.endpoints = {}
+        self.tree = [{}, None, {}]  # route tree node: [{segment: node}, parameter node, {method: endpoint}]
 
-    def route(self, route, methods=['GET']):
+    def route(self, route, methods=['GET'], **options):
         def wrap(f):
             print("ADD ROUTE", route, methods, f)
+            if options.get('cache') and self.cache is None:
+                from itiot.cache import Cache
+                self.cache = Cache(size=self.cache_size, budget=self.cache_budget)
             self.endpoints[route, tuple(methods)] = f
+            self.compile(route, tuple(methods), f, options)
             return f
         return wrap
 
+    def compile(self, route, methods, callback, options={}):
+        """
+        Add `route` to the route tree, one node per path segment,
+        so that resolving a request walks the tree instead of matching regexes.
+        """
+        node = self.tree
+        arguments = []
+        for i, segment in enumerate(route.split('/')):
+            if segment.startswith(':'):
+                arguments.append((i, segment[1:]))
+                if node[1] is None:
+                    node[1] = [{}, None, {}]
+                node = node[1]
+            else:
+                node = node[0].setdefault(segment, [{}, None, {}])
+        for method in methods:
+            node[2][method] = route, methods, callback, arguments, options
+
+    def walk(self, node, segments, i, method):
+        """
+        Return the endpoint matching `segments` from index `i`,
+        trying static segments before parameters, or None.
+        """
+        if i == len(segments):
+            return node[2].get(method)
+        segment = segments[i]
+        child = node[0].get(segment)
+        if child is not None:
+            endpoint = self.walk(child, segments, i+1, method)
+            if endpoint is not None:
+                return endpoint
+        if node[1] is not None and segment:
+            return self.walk(node[1], segments, i+1, method)
+
     def resolve(self, request):
-        endpoints = sorted(
-            item for item in self.endpoints.items(),
-            key=lambda l: len(l[0][0]),
-            reverse=True)
-
-        for endpoint, callback in endpoints:
-            route, methods = endpoint
-            if request.method in methods:
-                pattern = '/'.join(c.replace(':%s'%c[1:], '[^/].*') for c in route.split('/'))
-                pattern = '^%s$' % pattern
-                print('TRY', methods, route, '- regex:', pattern,
-                      'against', request.method, request.path)
-                if ure.match(pattern, request.path):
-                    print('MATCH', request.method, request.path, 'with', methods, route)
-                    arguments = {}
-                    for i, component in enumerate(route.split('/')):
-                        if component.startswith(':'):
-                            value = request.path.split('/')[i]
-                            if len(value):
-                                argument = component.lstrip(':')
-                                arguments[argument] = value
-                    return route, methods, callback, arguments
-        raise HTTPException('No route found for request %s' % request, status=404)
-
-    def handle(self, bytes):
-        self.request = Request(bytes)
-        print('HANDLE', self.request, 'with headers', self.request.headers, '-+- raw:', bytes)
+        segments = request.path.split('/')
+        endpoint = self.walk(self.tree, segments, 0, request.method)
+        if endpoint is None:
+            raise HTTPException('No route found for request %s' % request, status=404)
+        route, methods, callback, arguments, options = endpoint
+        arguments = {name: segments[i] for i, name in arguments}
+        if options.get('request'):
+            arguments['request'] = request
+        return route, methods, callback, arguments, options
+
+    def handle(self, request):
+        """
+        Return the response to `request`, a Request or the bytes of a request.
+        Coroutine handlers are run until complete on the event loop.
+        """
         try:
-            route, methods, callback, arguments = self.resolve(self.request)
-            result = callback(**arguments)
-        except HTTPException as e:
-            result = Response(str(e), e.status)
+            request = request if isinstance(request, Request) else Request(request)
+            if self.debug:
+                print('HANDLE', request, 'with headers', request.headers)
+            route, methods, callback, arguments, options = self.resolve(request)
+            if options.get('cache') and request.method == 'GET':
+                key = '%s?%s' % (request.path, request.query)
+                response = self.cache.call(key, self.call, callback, arguments, options, ttl=options['cache'])
+                response = self.restore(key, response)
+            else:
+                response = self.call(callback, arguments, options)
+            response = self.conditional(request, response)
+        except Exception as e:
             if self.debug:
                 raise
+            response = self.respond(self.error(e))
+        return response
+
+    async def ahandle(self, request):
+        """
+        Return the response to `request`, awaiting coroutine handlers
+        so that other requests are served meanwhile.
+        """
+        try:
+            if self.debug:
+                print('HANDLE', request, 'with headers', request.headers)
+            route, methods, callback, arguments, options = self.resolve(request)
+            if options.get('cache') and request.method == 'GET':
+                key = '%s?%s' % (request.path, request.query)
+                response = await self.cache.acall(key, self.acall, callback, arguments, options, ttl=options['cache'])
+                response = self.restore(key, response)
+            else:
+                response = await self.acall(callback, arguments, options)
+            response = self.conditional(request, response)
         except Exception as e:
-            result = Response('%s: %s' % (e.__class__.__name__, str(e)), 500)
             if self.debug:
                 raise
+            response = self.respond(self.error(e))
+        return response
+
+    def call(self, callback, arguments, options):
+        result = callback(**arguments)
+        if options.get('coroutine'):
+            result = asyncio.get_event_loop().run_until_complete(result)
+        elif options.get('sliced'):
+            result = slices(result)
+        return self.respond(result, tag=not options.get('sliced'))
+
+    async def acall(self, callback, arguments, options):
+        result = callback(**arguments)
+        if options.get('coroutine'):
+            result = await result
+        elif options.get('sliced'):
+            result = await aslices(result)
+        return self.respond(result, tag=not options.get('sliced'))
+
+    def conditional(self, request, response):
+        """
+        Return a header-only 304 response if `request` has an If-None-Match
+        matching the ETag of `response`, else `response`.
+        """
+        etag = response.headers.get('ETag')
+        match = request.headers.get('if-none-match') if etag else None
+        if not match or request.method not in ('GET', 'HEAD'):
+            return response
+        etag = etag.replace('W/', '')
+        if match.strip() == '*' or etag in [m.strip().replace('W/', '') for m in match.split(',')]:
+            response = Response(b'', 304, {'ETag': response.headers['ETag']})
+            del response.headers['Content-Length']
+        return response
+
+    def restore(self, key, response):
+        """
+        Return a copy of cached `response`, to be sent as its own.
+        Streamed responses cannot be cached: they are removed from cache.
+        """
+        if response.streamed(response.body):
+            self.cache.delete(key)
+            return response
+        return Response(response.body, response.status, response.headers)
+
+    def error(self, e):
+        if isinstance(e, HTTPException):
+            return Response(str(e), e.status)
+        return Response('%s: %s' % (e.__class__.__name__, str(e)), 500)
+
+    def respond(self, result, tag=True):
+        """
+        Return `result` as a Response, tagged with an ETag if `tag`
+        (not for sliced handlers: the checksum of a large body would block).
+        """
         response = result if isinstance(result, Response) else Response(result)
-        print('--8<---', response)
+        if tag and self.etag and response.status == 200 and 'ETag' not in response.headers \
+                and not response.streamed(response.body):
+            response.headers['ETag'] = '"%08x"' % (crc32(response.body) & 0xffffffff)
+        if self.debug:
+            print('--8<---', response)
         return response
 
     def run(self, host='0.0.0.0', port=80, socket=Asyncio):
@@ -1,18 +1,140 @@
-import network
+"""
+Network connection.
+"""
+
 import time
 
+try:
+    import network
+except ImportError:
+    network = None  # plain python: give Wifi a fake `nic`, eg. for testing
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio  # plain python
+
 class Wifi(object):
+    """
+    Wifi station, on interface `nic` (default: network.WLAN(network.STA_IF)).
+    """
 
-    def connect(self, ssid, psk, ip=None, mask=None, gateway=None, dns=None):
-        self.nic = network.WLAN(network.STA_IF)
+    poll = 0.2  # seconds between connection checks while connecting
+
+    def __init__(self, nic=None):
+        self.nic = nic if nic is not None else network.WLAN(network.STA_IF)
+
+    @property
+    def connected(self):
+        return self.nic.isconnected()
+
+    def rssi(self):
+        """
+        Return the received signal strength in dBm, or None if not available.
+        """
+        try:
+            return self.nic.status('rssi')
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def start(self, ssid, psk):
         self.nic.active(True)
         self.nic.connect(ssid, psk)
+
+    def configure(self, ip=None, mask=None, gateway=None, dns=None):
+        if ip or mask or gateway or dns:
+            config = [given or current for given, current in zip((ip, mask, gateway, dns), self.nic.ifconfig())]
+            self.nic.ifconfig(config)
+        print('Network connected:', self.nic.ifconfig())
+
+    def connect(self, ssid, psk, ip=None, mask=None, gateway=None, dns=None):
+        self.start(ssid, psk)
         while not self.nic.isconnected():
             print('Waiting for network on', self.nic)
             time.sleep(1)
-        if ip:
-            self.nic.ifconfig([ip] + list(self.nic.ifconfig()[1:]))
-        print('Network connected:', self.nic.ifconfig())
+        self.configure(ip, mask, gateway, dns)
+
+    async def aconnect(self, ssid, psk, ip=None, mask=None, gateway=None, dns=None, timeout=30):
+        """
+        Connect without blocking other tasks, raising OSError after `timeout` seconds.
+        """
+        self.start(ssid, psk)
+        start = time.time()
+        while not self.nic.isconnected():
+            if time.time() - start > timeout:
+                self.nic.disconnect()
+                raise OSError('Timeout connecting to %s' % ssid)
+            await asyncio.sleep(self.poll)
+        self.configure(ip, mask, gateway, dns)
+
+class Supervisor(object):
+    """
+    Keep `wifi` connected to `ssid` as a background task (`run`):
+    the link is checked every `check` seconds and reconnected when down,
+    waiting `backoff` seconds after a failure, doubled after each failure
+    up to `backoff_max`. The signal strength is averaged in `rssi` (dBm).
+    `on_connect` and `on_disconnect` are called with the supervisor:
+    their exceptions are printed and counted in `errors`, not raised.
+    """
+
+    check = 2  # seconds between link checks
+    timeout = 20  # seconds to wait for a connection
+    backoff = 1  # seconds to wait after a first failure
+    backoff_max = 60
+    alpha = 0.2  # weight of new RSSI readings in the average
+
+    def __init__(self, wifi, ssid, psk, ip=None, on_connect=None, on_disconnect=None):
+        self.wifi = wifi
+        self.ssid = ssid
+        self.psk = psk
+        self.ip = ip
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.up = False
+        self.rssi = None
+        self.connects = 0
+        self.disconnects = 0
+        self.failures = 0
+        self.errors = 0
+
+    async def run(self):
+        delay = self.backoff
+        while True:
+            if not self.wifi.connected:
+                if self.up:
+                    self.up = False
+                    self.disconnects += 1
+                    print('Network disconnected')
+                    self.notify(self.on_disconnect)
+                try:
+                    await self.wifi.aconnect(self.ssid, self.psk, self.ip, timeout=self.timeout)
+                except OSError as e:
+                    self.failures += 1
+                    print('Network connection failed (%s), retrying in %ss' % (e, delay))
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.backoff_max)
+                    continue
+                delay = self.backoff
+                self.up = True
+                self.connects += 1
+                self.notify(self.on_connect)
+            self.track()
+            await asyncio.sleep(self.check)
+
+    def notify(self, callback):
+        """
+        Call `callback` with the supervisor, if any, without letting its
+        exceptions stop the supervisor.
+        """
+        if callback is None:
+            return
+        try:
+            callback(self)
+        except Exception as e:
+            self.errors += 1
+            print('Network callback %s failed:' % callback, e.__class__.__name__, e)
 
-    async def aconnect(ssid, psk, ip=None):
-        raise NotImplementedError('todo.')
+    def track(self):
+        rssi = self.wifi.rssi()
+        if rssi is not None:
+            self.rssi = rssi if self.rssi is None else self.rssi + self.alpha * (rssi - self.rssi)
@@ -0,0 +1,183 @@
+"""
+Over-the-air file updates: HTTP endpoints receiving files into the MCU
+filesystem, eg. for deploying over Wi-Fi instead of serial, with
+`toolchain/sync.py --ota <host>`:
+
+    app = http.App(__name__)
+    ota.Receiver(token='secret').register(app)
+
+Files are uploaded in chunks (of at most http.Request.body_limit bytes)
+written to `<path>.part`, each chunk checked with its CRC32 and optionally
+compressed (zlib, with a 1K window). Once complete, the file is checked
+with its size and SHA256 and renamed to `path`: a file is replaced
+entirely or not at all, even if the upload is interrupted.
+
+Endpoints, with the file path and arguments in the query string:
+- GET, PUT, DELETE <prefix>/file?path=..[&offset=..&crc=..&z=1] (PUT appends a chunk at `offset`)
+- POST <prefix>/commit?path=..&size=..&sha256=..
+- POST <prefix>/mkdir?path=..
+"""
+
+import os
+
+from itiot.http import HTTPException, Response
+
+try:
+    import uhashlib as hashlib
+    from ubinascii import crc32, hexlify
+except ImportError:
+    import hashlib  # plain python
+    from binascii import crc32, hexlify
+
+wbits = 10  # compression window of 1K, as used by toolchain/sync.py
+
+try:
+    from zlib import decompress
+    inflate = lambda data: decompress(data, wbits)
+except ImportError:
+    import deflate, io  # micropython >= 1.21
+    inflate = lambda data: deflate.DeflateIO(io.BytesIO(data), deflate.ZLIB, wbits).read()
+
+def unquote(text):
+    """
+    Decode the %XX escapes and + of a query string value.
+    """
+    parts = text.replace('+', ' ').split('%')
+    decoded = bytearray(parts[0].encode())
+    for part in parts[1:]:
+        decoded.append(int(part[:2], 16))
+        decoded.extend(part[2:].encode())
+    return bytes(decoded).decode()
+
+def params(query):
+    """
+    Return the arguments in `query`, eg. 'path=main.py&offset=0', as a dict.
+    """
+    values = {}
+    for pair in query.split('&'):
+        if pair:
+            name, _, value = pair.partition('=')
+            values[name] = unquote(value)
+    return values
+
+def equal(a, b):
+    """
+    Return whether string `b` equals non-empty string `a`, comparing every
+    byte of `b` and combining the differences (like hmac.compare_digest):
+    the time taken does not tell how many leading bytes match.
+    """
+    a, b = a.encode(), b.encode()
+    difference = len(a) ^ len(b)
+    for i in range(len(b)):
+        difference |= a[i % len(a)] ^ b[i]
+    return not difference
+
+class Receiver(object):
+    """
+    Receive files into directory `root` through the endpoints registered on an
+    http.App by `register`. Requests must have the header X-OTA-Token: `token`,
+    required unless `insecure` (anyone on the network may then write any file).
+    """
+
+    chunk = 512  # size of reads when sending or checking files, in bytes
+
+    def __init__(self, root='/', token=None, insecure=False):
+        if not token and not insecure:
+            raise ValueError('OTA receiver requires a token (or insecure=True)')
+        self.root = root.rstrip('/')
+        self.token = token
+        self.received = 0  # files received
+
+    def register(self, app, prefix='/ota'):
+        app.route(prefix + '/file', methods=['GET', 'PUT', 'DELETE'], request=True)(self.file)
+        app.route(prefix + '/commit', methods=['POST'], request=True)(self.commit)
+        app.route(prefix + '/mkdir', methods=['POST'], request=True)(self.mkdir)
+
+    def arguments(self, request):
+        """
+        Return the query arguments of `request`, with `path` in `root`.
+        """
+        if self.token and not equal(self.token, request.headers.get('x-ota-token', '')):
+            raise HTTPException('Invalid OTA token', status=403)
+        arguments = params(request.query)
+        path = arguments.get('path', '').strip('/')
+        if '..' in path.split('/'):
+            raise HTTPException('Invalid path: %s' % path, status=400)
+        arguments['path'] = '%s/%s' % (self.root, path) if path else self.root or '/'
+        return arguments
+
+    def file(self, request):
+        arguments = self.arguments(request)
+        path = arguments['path']
+        if request.method == 'GET':
+            try:
+                length = os.stat(path)[6]
+            except OSError:
+                raise HTTPException('No such file: %s' % path, status=404)
+            return Response(self.read(path), headers={'Content-Type': 'application/octet-stream',
+                                                      'Content-Length': length})
+        if request.method == 'DELETE':
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # already deleted
+            return ''
+        data = request.data
+        if 'crc' in arguments and crc32(data) & 0xffffffff != int(arguments['crc'], 16):
+            raise HTTPException('CRC mismatch in chunk of %s' % path, status=400)
+        offset = int(arguments.get('offset', 0))
+        part = path + '.part'
+        if offset:
+            try:
+                size = os.stat(part)[6]
+            except OSError:
+                size = 0
+            if size != offset:  # chunk lost or repeated
+                raise HTTPException('Chunk at %d, expected %d' % (offset, size), status=409)
+        if arguments.get('z') == '1':
+            data = inflate(bytes(data))
+        with open(part, 'ab' if offset else 'wb') as f:
+            f.write(data)
+        return str(offset + len(data))
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk)
+                if not chunk:
+                    return
+                yield chunk
+
+    def commit(self, request):
+        """
+        Check the received `<path>.part` and rename it to `path`.
+        """
+        arguments = self.arguments(request)
+        path = arguments['path']
+        part = path + '.part'
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            for chunk in self.read(part):
+                digest.update(chunk)
+                size += len(chunk)
+        except OSError:
+            raise HTTPException('No upload for %s' % path, status=404)
+        if size != int(arguments.get('size', -1)) or hexlify(digest.digest()).decode() != arguments.get('sha256'):
+            os.remove(part)
+            raise HTTPException('Checksum mismatch for %s' % path, status=422)
+        try:
+            os.rename(part, path)
+        except OSError:  # eg. FAT does not rename onto an existing file
+            os.remove(path)
+            os.rename(part, path)
+        self.received += 1
+        return ''
+
+    def mkdir(self, request):
+        path = self.arguments(request)['path']
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass  # exists
+        return ''
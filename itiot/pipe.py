@@ -0,0 +1,292 @@
+"""
+Data pipes: chains of elements where data flows, eg.
+
+    pipe = Pipe(Poll(touch), Normalize(max=1023), Boolean(threshold=0.3), Update(led))
+
+Values are pulled from the source element one at a time (`pipe.read()`),
+by iterating the pipe (`for value in pipe`, `next(pipe)`), or pushed into it
+(`pipe.push(value)`). A pipe calls the `process` method of each element in one
+loop (elements are fused): there is no generator frame per element and per value.
+An element drops a value by returning `skip`, which stops the value there.
+"""
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import time  # plain python
+    ticks_ms = lambda: int(time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+skip = object()
+
+class Element(object):
+    """
+    Pipe element, processing a value and returning the value passed downstream.
+    """
+    __slots__ = ()
+
+    def process(self, value):
+        return value
+
+class Source(Element):
+    """
+    Pipe source element, reading values (raising StopIteration when exhausted,
+    returning `skip` when no value is available yet).
+    """
+    __slots__ = ()
+
+    def read(self):
+        raise NotImplementedError('Implement reading values')
+
+class Pipe(Element):
+    """
+    Chain of `elements`, themselves elements or plain functions of a value.
+    The first element is the source if it is a Source, a pipe with a source,
+    an object with a `read` method (eg. a machine.ADC, polled),
+    or an iterable (eg. a list or a generator).
+    Pipes without source nested in a pipe are flattened into it.
+    """
+    __slots__ = ('source', 'elements', 'steps', 'values')
+
+    def __init__(self, *elements):
+        self.source = None
+        first = elements[0] if elements else None
+        if isinstance(first, Source) or isinstance(first, Pipe) and first.source is not None:
+            self.source, elements = first, elements[1:]
+        elif first is not None and not isinstance(first, Element) and not callable(first):
+            self.source = first if hasattr(first, 'read') else Iterate(first)
+            elements = elements[1:]
+        flat = []
+        for element in elements:
+            if isinstance(element, Pipe) and element.source is None:
+                flat.extend(element.elements)
+            else:
+                flat.append(element)
+        self.elements = tuple(flat)
+        self.steps = tuple(element.process if isinstance(element, Element) else element for element in flat)
+        self.values = self.iterate()  # resumed by next(pipe)
+
+    def push(self, value):
+        """
+        Process `value` through the pipe elements, returning the output value or `skip`.
+        """
+        for step in self.steps:
+            value = step(value)
+            if value is skip:
+                return skip
+        return value
+
+    process = push
+
+    def read(self):
+        """
+        Pull one value from the source through the pipe and return it,
+        or `skip` if an element dropped it or the source has no value yet.
+        """
+        value = self.source.read()
+        if value is skip:
+            return skip
+        for step in self.steps:  # inlined push, saving a call per value
+            value = step(value)
+            if value is skip:
+                return skip
+        return value
+
+    def iterate(self):
+        """
+        Generate the values getting through the pipe: one generator resumed
+        per value, with the source and the steps in local variables.
+        """
+        read, steps = self.source.read, self.steps
+        try:
+            while True:
+                value = read()
+                if value is skip:
+                    continue
+                for step in steps:
+                    value = step(value)
+                    if value is skip:
+                        break
+                else:
+                    yield value
+        except StopIteration:
+            return
+
+    def __iter__(self):
+        return self.values
+
+    def __next__(self):
+        """
+        Pull values until one gets through the pipe, and return it.
+        """
+        return next(self.values)
+
+# Sources
+
+class Iterate(Source):
+    """
+    Read values from an iterable, eg. a list or a generator.
+    """
+    __slots__ = ('iterator',)
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+
+    def read(self):
+        return next(self.iterator)
+
+class Poll(Source):
+    """
+    Read values by polling `obj` with function `read` (default: `obj.read()`),
+    eg. a machine.ADC or TouchPad.
+    """
+    __slots__ = ('obj', 'reader')
+
+    def __init__(self, obj, read=None):
+        self.obj = obj
+        self.reader = obj.read if read is None else lambda: read(obj)
+
+    def read(self):
+        return self.reader()
+
+# Processing
+
+class Apply(Element):
+    """
+    Apply function `f` to values.
+    """
+    __slots__ = ('f',)
+
+    def __init__(self, f):
+        self.f = f
+
+    def process(self, value):
+        return self.f(value)
+
+class Filter(Element):
+    """
+    Pass only values for which `predicate` is true.
+    """
+    __slots__ = ('predicate',)
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def process(self, value):
+        return value if self.predicate(value) else skip
+
+class Normalize(Element):
+    """
+    Normalize values in range `min`..`max` to the range 0..1.
+    """
+    __slots__ = ('min', 'scale')
+
+    def __init__(self, max, min=0):
+        self.min = min
+        self.scale = 1 / (max - min)
+
+    def process(self, value):
+        return (value - self.min) * self.scale
+
+class Clamp(Element):
+    """
+    Clamp values to the range `min`..`max`.
+    """
+    __slots__ = ('min', 'max')
+
+    def __init__(self, min=0, max=1):
+        self.min = min
+        self.max = max
+
+    def process(self, value):
+        return self.min if value < self.min else self.max if value > self.max else value
+
+class Boolean(Element):
+    """
+    Convert values to True if greater or equal than `threshold`, else False.
+    """
+    __slots__ = ('threshold',)
+
+    def __init__(self, threshold=0.5):
+        self.threshold = threshold
+
+    def process(self, value):
+        return value >= self.threshold
+
+class Changed(Element):
+    """
+    Pass values only when they changed more than the deadband from the last
+    passed value: `delta` (absolute) or `relative` (fraction of the last value),
+    whichever is larger. A change reversing the direction of the last one must
+    also exceed `hysteresis`, to stop flapping around a value.
+    Values pass anyway after `heartbeat` seconds without passing any.
+    With no deadband, values pass when different (eg. booleans).
+    Values dropped are counted as `suppressed`.
+    """
+    __slots__ = ('delta', 'relative', 'hysteresis', 'heartbeat', 'clock',
+                 'last', 'direction', 'time', 'suppressed')
+
+    def __init__(self, delta=0, relative=0, hysteresis=0, heartbeat=None, clock=ticks_ms):
+        self.delta = delta
+        self.relative = relative
+        self.hysteresis = hysteresis
+        self.heartbeat = None if heartbeat is None else int(heartbeat * 1000)
+        self.clock = clock
+        self.last = skip
+        self.direction = 0
+        self.time = 0
+        self.suppressed = 0
+
+    def changed(self, value):
+        if not (self.delta or self.relative or self.hysteresis):
+            return value != self.last
+        difference = value - self.last
+        direction = 1 if difference > 0 else -1 if difference < 0 else 0
+        band = max(self.delta, self.relative * abs(self.last))
+        if self.direction and direction == -self.direction:
+            band += self.hysteresis
+        if abs(difference) > band:
+            self.direction = direction
+            return True
+        return False
+
+    def process(self, value):
+        if self.last is not skip and not self.changed(value):
+            if self.heartbeat is None or ticks_diff(self.clock(), self.time) < self.heartbeat:
+                self.suppressed += 1
+                return skip
+        self.last = value
+        if self.heartbeat is not None:
+            self.time = self.clock()
+        return value
+
+# Sinks
+
+class Debug(Element):
+    """
+    Print values, prefixed with `prefix`.
+    """
+    __slots__ = ('prefix',)
+
+    def __init__(self, prefix='Value'):
+        self.prefix = prefix
+
+    def process(self, value):
+        print(self.prefix, value)
+        return value
+
+class Update(Element):
+    """
+    Write values to `obj` with function `write` (default: `obj.value(value)`),
+    eg. a machine.Pin or Signal
+    (for a machine.PWM, use `write=lambda pwm, value: pwm.duty(int(value*1023))`).
+    """
+    __slots__ = ('obj', 'writer')
+
+    def __init__(self, obj, write=None):
+        self.obj = obj
+        self.writer = obj.value if write is None else lambda value: write(obj, value)
+
+    def process(self, value):
+        self.writer(value)
+        return value
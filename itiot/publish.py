@@ -0,0 +1,181 @@
+"""
+Telemetry publishing: a pipe sink batching values into frames, eg.
+
+    pipe = Pipe(Poll(adc), Normalize(max=4095), Changed(delta=0.01),
+                Publish('192.168.0.10', '/telemetry', scale=1000, size=64, age=10))
+
+    scheduler.add(pipe, period=0.1)
+    scheduler.add(pipe.elements[-1].flush, period=1)  # posts, apart from the pipe
+
+Values are encoded as they arrive, with their time, as deltas from the
+previous value in zigzag varints: steady readings take 2 bytes each.
+Frames are closed when `size` values are buffered or when the oldest is
+`age` seconds old, and queued: the pipe never waits for the network.
+`flush` posts the queued frames on one kept-alive HTTP/1.1 connection,
+from its own task. Frames that failed to post are kept in a bounded
+backlog and retried on next flush, unless the server rejected them (4xx).
+
+Frame format, all varints: scale, count, time of first value (Unix time
+in ms), first value * scale (zigzag), then for each next value: time delta
+(ms) and value delta (zigzag). Decode with `decode`.
+Values are timed with ticks_ms, and frames with the wall clock when sealed:
+set the RTC (eg. with ntptime) for the Unix time to be right.
+"""
+
+from itiot.http import Client
+from itiot.pipe import Element
+
+from time import time, localtime
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    ticks_ms = lambda: int(time() * 1000)  # plain python
+    ticks_diff = lambda a, b: a - b
+
+epoch = 946684800 if localtime(0)[0] == 2000 else 0  # seconds from 1970 to the epoch of time()
+
+def unix_ms():
+    """
+    Return the Unix time in ms, from `time.time()` (to the second on MicroPython).
+    """
+    return int((time() + epoch) * 1000)
+
+def varint(buffer, n):
+    """
+    Append unsigned int `n` to `buffer`, 7 bits per byte (LEB128).
+    """
+    while n > 0x7f:
+        buffer.append(n & 0x7f | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+def zigzag(n):
+    """
+    Map signed int `n` to an unsigned int, small for small negative `n`.
+    """
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def unvarint(data, i):
+    """
+    Return the unsigned int at index `i` of `data` and the index following it.
+    """
+    n = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        n |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return n, i
+
+def unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+def decode(frame):
+    """
+    Return the list of (time in ms, value) encoded in `frame`.
+    """
+    scale, i = unvarint(frame, 0)
+    count, i = unvarint(frame, i)
+    time, i = unvarint(frame, i)
+    value, i = unvarint(frame, i)
+    value = unzigzag(value)
+    values = [(time, value / scale)]
+    for _ in range(count - 1):
+        delta, i = unvarint(frame, i)
+        time += delta
+        delta, i = unvarint(frame, i)
+        value += unzigzag(delta)
+        values.append((time, value / scale))
+    return values
+
+class Publish(Element):
+    """
+    Pipe sink posting values to `host`:`port` at `path`, in frames of at most
+    `size` values or `age` seconds, keeping at most `backlog` frames to retry.
+    Values are multiplied by `scale` (an int) and rounded to ints for encoding.
+    Frames dropped because of a full backlog are counted as `dropped`, frames
+    rejected by the server (4xx, besides 408 and 429) as `rejected`.
+    `clock` returns ticks in ms and `wall` the Unix time in ms.
+    """
+    __slots__ = ('client', 'path', 'scale', 'size', 'age', 'backlog', 'clock', 'wall',
+                 'frame', 'count', 'start', 'first', 'time', 'value', 'frames', 'sent', 'dropped', 'rejected')
+
+    content_type = 'application/x-itiot-frame'
+
+    def __init__(self, host, path='/', port=80, scale=1, size=64, age=10, backlog=4, clock=ticks_ms, wall=unix_ms,
+                 client=None):
+        self.client = client or Client(host, port)
+        self.path = path
+        self.scale = scale
+        self.size = size
+        self.age = int(age * 1000)
+        self.backlog = backlog
+        self.clock = clock
+        self.wall = wall
+        self.frames = []  # encoded frames waiting to be posted
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.reset()
+
+    def reset(self):
+        self.frame = bytearray()
+        self.count = 0
+        self.start = self.first = self.time = self.value = 0
+
+    def process(self, value):
+        now = self.clock()
+        encoded = int(round(value * self.scale))
+        if self.count:
+            varint(self.frame, ticks_diff(now, self.time))
+            varint(self.frame, zigzag(encoded - self.value))
+        else:
+            self.start, self.first = now, encoded
+        self.time, self.value = now, encoded
+        self.count += 1
+        if self.count >= self.size or ticks_diff(now, self.start) >= self.age:
+            self.seal()
+        return value
+
+    def seal(self):
+        """
+        Close the current frame and queue it for posting, dropping the oldest
+        frame if the backlog is full.
+        """
+        frame = bytearray()
+        varint(frame, self.scale)
+        varint(frame, self.count)
+        varint(frame, self.wall() - ticks_diff(self.clock(), self.start))  # Unix time of the first value
+        varint(frame, zigzag(self.first))
+        self.frames.append(frame + self.frame)
+        self.reset()
+        if len(self.frames) > self.backlog:
+            self.frames.pop(0)
+            self.dropped += 1
+
+    def flush(self, force=False):
+        """
+        Close the current frame if old enough (or if `force`), and post
+        the frames waiting, returning True if none is left to retry.
+        Posting blocks up to the client timeouts: call it periodically from
+        its own task (eg. of a scheduler), not from the pipe.
+        """
+        if self.count and (force or ticks_diff(self.clock(), self.start) >= self.age):
+            self.seal()
+        while self.frames:
+            try:
+                status, headers, body = self.client.request('POST', self.path, self.frames[0],
+                                                            {'Content-Type': self.content_type})
+            except OSError:
+                return False  # retried on next flush
+            if 400 <= status < 500 and status not in (408, 429):
+                self.frames.pop(0)  # would be rejected again
+                self.rejected += 1
+                continue
+            if status >= 300:
+                return False
+            self.frames.pop(0)
+            self.sent += 1
+        return True
@@ -0,0 +1,98 @@
+"""
+Sampling at a fixed rate with a hardware timer, eg.
+
+    sampler = Sampler(adc, freq=1000, pipe=Pipe(Mean(size=100), Update(led)))
+    sampler.start()
+
+The timer callback only reads a sample into a preallocated ring buffer
+(it runs in interrupt context: it must not allocate memory), then hands
+over processing to the main context with `micropython.schedule`, where
+the buffered samples are pushed through the pipe. Slow processing delays
+the pipe but not the sampling, until the ring buffer is full.
+"""
+
+from array import array
+
+from itiot.pipe import Source, skip
+
+try:
+    from micropython import schedule
+except ImportError:
+    schedule = lambda f, arg: f(arg)  # plain python: no interrupt context
+
+class Sampler(Source):
+    """
+    Sample `obj` (eg. a machine.ADC) with function `read` (default: `obj.read()`)
+    `freq` times per second into a ring buffer of `size` samples of `typecode`.
+    With a `pipe`, samples are pushed into it from the main context; without,
+    samples are read from the sampler as a source (eg. by a scheduled pipe).
+    The `timer` is a machine.Timer id (default: hardware timer 0) or a timer object:
+    it and `schedule` can be replaced, eg. for testing.
+    Samples taken while the buffer is full are dropped and counted as `overruns`.
+    """
+    __slots__ = ('reader', 'freq', 'pipe', 'timer', 'schedule', 'buffer',
+                 'head', 'tail', 'pending', 'overruns', 'callback', 'drainer')
+
+    def __init__(self, obj, freq=100, size=64, pipe=None, read=None, timer=0, schedule=schedule, typecode='H'):
+        self.reader = obj.read if read is None else lambda: read(obj)
+        self.freq = freq
+        self.pipe = pipe
+        self.timer = timer
+        self.schedule = schedule
+        self.buffer = array(typecode, [0] * (size + 1))  # one slot kept free to tell full from empty
+        self.head = 0  # written by the timer callback only
+        self.tail = 0  # written by the main context only
+        self.pending = False
+        self.overruns = 0
+        self.callback = self.sample  # bound methods allocate: create them once
+        self.drainer = self.drain
+
+    def start(self):
+        if isinstance(self.timer, int):
+            import machine
+            self.timer = machine.Timer(self.timer)
+        self.timer.init(freq=self.freq, callback=self.callback)
+
+    def stop(self):
+        self.timer.deinit()
+
+    def __len__(self):
+        length = self.head - self.tail
+        return length + len(self.buffer) if length < 0 else length
+
+    def sample(self, timer):
+        """
+        Timer callback: store a sample and schedule the pipe, without allocating.
+        """
+        head = self.head + 1
+        if head == len(self.buffer):
+            head = 0
+        if head == self.tail:
+            self.overruns += 1
+        else:
+            self.buffer[self.head] = self.reader()
+            self.head = head
+        if self.pipe is not None and not self.pending:
+            self.pending = True
+            self.schedule(self.drainer, 0)
+
+    def read(self):
+        tail = self.tail
+        if tail == self.head:
+            return skip
+        value = self.buffer[tail]
+        tail += 1
+        self.tail = 0 if tail == len(self.buffer) else tail
+        return value
+
+    def drain(self, _=None):
+        """
+        Push the buffered samples through the pipe, in the main context.
+        """
+        self.pending = False
+        push = self.pipe.push
+        while True:
+            value = self.read()
+            if value is skip:
+                break
+            push(value)
@@ -0,0 +1,121 @@
+"""
+Cooperative scheduler running many pipes concurrently, eg.
+
+    scheduler = Scheduler()
+    scheduler.add(Pipe(Poll(touch), Normalize(max=1023), Update(pwm)), period=0.05, priority=1)
+    publish = Publish(...)
+    scheduler.add(Pipe(Poll(dht), publish), period=10)
+    scheduler.add(publish.flush, period=10, priority=-1)  # posts, apart from the pipes
+    loop.create_task(scheduler.run())
+
+Each task pulls one value through its pipe every `period` seconds.
+Between due tasks, the scheduler sleeps (letting other coroutines run)
+instead of busy-looping over the pipes.
+"""
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio  # plain python
+
+try:
+    from time import ticks_ms, ticks_add, ticks_diff
+except ImportError:
+    from time import time  # plain python
+    ticks_ms = lambda: int(time() * 1000)
+    ticks_add = lambda a, b: a + b
+    ticks_diff = lambda a, b: a - b
+
+class Task(object):
+    """
+    Pipe (or function) run every `period` seconds, which overruns when it
+    completes later than `deadline` seconds (default: `period`) after being due.
+    Among due tasks, the ones with a higher `priority` run first.
+    A task raising an exception is counted in `errors` and run again next period.
+    """
+    __slots__ = ('pipe', 'period', 'deadline', 'priority', 'due',
+                 'runs', 'overruns', 'skipped', 'errors', 'jitter', 'jitter_max', 'duration_max')
+
+    def __init__(self, pipe, period, deadline=None, priority=0, due=0):
+        self.pipe = pipe.read if hasattr(pipe, 'read') else pipe
+        self.period = int(period * 1000)
+        self.deadline = self.period if deadline is None else int(deadline * 1000)
+        self.priority = priority
+        self.due = due
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0  # periods missed altogether
+        self.errors = 0
+        self.jitter = 0  # total lateness in ms, for the mean
+        self.jitter_max = 0
+        self.duration_max = 0
+
+    def stats(self):
+        return {'runs': self.runs, 'overruns': self.overruns, 'skipped': self.skipped, 'errors': self.errors,
+                'jitter': self.jitter / self.runs if self.runs else 0,
+                'jitter_max': self.jitter_max, 'duration_max': self.duration_max}
+
+class Scheduler(object):
+    """
+    Run tasks when due, by priority, on uasyncio (`run`) or from
+    any loop or timer calling `step`. `clock` returns milliseconds
+    and `sleep` is awaited with seconds, both replaceable for testing.
+    """
+
+    idle = 1  # max seconds to sleep without tasks
+
+    def __init__(self, clock=ticks_ms, sleep=None):
+        self.clock = clock
+        self.sleep = sleep or asyncio.sleep
+        self.tasks = []
+
+    def add(self, pipe, period, deadline=None, priority=0):
+        task = Task(pipe, period, deadline, priority, due=self.clock())
+        self.tasks.append(task)
+        self.tasks.sort(key=lambda task: -task.priority)
+        return task
+
+    def remove(self, task):
+        self.tasks.remove(task)
+
+    def step(self):
+        """
+        Run due tasks and return the milliseconds until the next task is due.
+        """
+        now = self.clock()
+        for task in self.tasks[:]:  # tasks exhausting their pipe are removed
+            late = ticks_diff(now, task.due)
+            if late < 0:
+                continue
+            try:
+                task.pipe()
+            except StopIteration:
+                self.remove(task)
+                continue
+            except Exception as e:  # a failing pipe does not stop the others
+                task.errors += 1
+                print('Scheduler: error in task %s:' % task.pipe, e.__class__.__name__, e)
+            end = self.clock()
+            task.runs += 1
+            task.jitter += late
+            task.jitter_max = max(task.jitter_max, late)
+            task.duration_max = max(task.duration_max, ticks_diff(end, now))
+            if ticks_diff(end, task.due) > task.deadline:
+                task.overruns += 1
+            task.due = ticks_add(task.due, task.period)
+            if ticks_diff(task.due, end) < 0:  # catch up without bursts
+                missed = ticks_diff(end, task.due) // task.period + 1
+                task.skipped += missed
+                task.due = ticks_add(task.due, missed * task.period)
+            now = end
+        wait = int(self.idle * 1000)
+        for task in self.tasks:
+            wait = min(wait, ticks_diff(task.due, now))
+        return max(wait, 0)
+
+    async def run(self):
+        while True:
+            await self.sleep(self.step() / 1000)
+
+    def stats(self):
+        return [task.stats() for task in self.tasks]
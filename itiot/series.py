@@ -0,0 +1,236 @@
+"""
+Time series log on flash: fixed-size binary records appended
+to segment files, eg.
+
+    log = Series('history/smoke', format='<If', records=512, segments=4, interval=60)
+    log.append(time.time(), reading)
+
+Segment files are allocated once, at full size, and records are written
+in place, so the files never grow. Records are buffered in RAM and written
+a `page` of bytes at a time (one seek and one write), sparing the flash a
+write per record: they are written when the page is full, when the oldest
+is `interval` seconds old, or when the app calls `flush` (eg. periodically).
+Buffered records are served and read as the others, but lost on power loss.
+When the last segment is full, the oldest segment is overwritten (ring).
+Each record starts with its sequence number (plus one, zero marks empty
+slots), so that the end of the log is found after reboot with a few reads.
+
+`respond` serves the records over HTTP, with support for Range requests
+(in bytes from the first record ever appended), eg. for draining the
+history after a network outage with `Range: bytes=<bytes received>-`.
+"""
+
+import os
+import struct
+
+from itiot.http import Response
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import time  # plain python
+    ticks_ms = lambda: int(time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+class Series(object):
+    """
+    Log of records packed with struct `format`, kept in `segments` files
+    of `records` records in directory `path`, and written to flash by `page`
+    bytes (a flash page or sector, 512 to 4096) or after `interval` seconds.
+    """
+
+    chunk = 512  # size of reads when serving records, in bytes
+
+    def __init__(self, path, format='<If', records=256, segments=4, page=512, interval=None):
+        self.path = path
+        self.format = '<I' + format.lstrip('<>!=@')
+        self.size = struct.calcsize(self.format)
+        self.records = records
+        self.segments = segments
+        self.interval = None if interval is None else int(interval * 1000)
+        self.buffer = bytearray(max(page // self.size, 1) * self.size)  # records not written yet
+        self.pending = 0  # number of records in buffer
+        self.time = 0  # of the oldest record in buffer, in ms
+        self.file = None  # file of the segment being appended to
+        self.segment = None
+        makedirs(path)
+        for segment in range(segments):
+            self.allocate(segment)
+        self.count = self.recover()
+
+    def filename(self, segment):
+        return '%s/%s.bin' % (self.path, segment)
+
+    def allocate(self, segment):
+        """
+        Create the segment file at full size, if missing or truncated.
+        """
+        filename = self.filename(segment)
+        length = self.records * self.size
+        try:
+            if os.stat(filename)[6] == length:
+                return
+        except OSError:
+            pass
+        zeros = bytes(self.chunk)
+        with open(filename, 'wb') as f:
+            for _ in range(length // self.chunk):
+                f.write(zeros)
+            f.write(zeros[:length % self.chunk])
+
+    def sequence(self, segment, slot):
+        """
+        Return the sequence number of the record in `slot` of `segment`, or -1 if empty.
+        """
+        with open(self.filename(segment), 'rb') as f:
+            f.seek(slot * self.size)
+            return struct.unpack('<I', f.read(4))[0] - 1
+
+    def recover(self):
+        """
+        Return the number of records ever appended, from the segment files.
+        """
+        base, latest = -1, None
+        for segment in range(self.segments):
+            sequence = self.sequence(segment, 0)
+            if sequence > base:
+                base, latest = sequence, segment
+        if latest is None:
+            return 0
+        low, high = 1, self.records  # records are appended in order: find the last one
+        while low < high:
+            middle = (low + high) // 2
+            if self.sequence(latest, middle) == base + middle:
+                low = middle + 1
+            else:
+                high = middle
+        return base + low
+
+    @property
+    def first(self):
+        """
+        Sequence number of the oldest record kept: the segments keep the last
+        `segments * records` records, older ones were overwritten in place.
+        """
+        return max(0, self.count - self.segments * self.records)
+
+    def __len__(self):
+        return self.count - self.first
+
+    def append(self, *values):
+        """
+        Buffer a record of `values`, writing the buffer if full, at the end
+        of a segment, or if its oldest record is `interval` seconds old.
+        """
+        if not self.pending:
+            self.time = ticks_ms()
+        struct.pack_into(self.format, self.buffer, self.pending * self.size, self.count + 1, *values)
+        self.pending += 1
+        self.count += 1
+        if (self.pending * self.size == len(self.buffer) or not self.count % self.records
+                or self.interval is not None and ticks_diff(ticks_ms(), self.time) >= self.interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records to flash, in one write.
+        """
+        if not self.pending:
+            return
+        start = self.count - self.pending
+        segment = (start // self.records) % self.segments
+        if segment != self.segment:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(self.filename(segment), 'r+b')
+            self.segment = segment
+        self.file.seek((start % self.records) * self.size)
+        self.file.write(memoryview(self.buffer)[:self.pending * self.size])
+        self.file.flush()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+        self.file = self.segment = None
+
+    def chunks(self, start, stop):
+        """
+        Generate records `start` to `stop` (sequence numbers) as chunks of bytes,
+        from flash and from the buffer.
+        """
+        written = self.count - self.pending
+        buffered = bytes(self.buffer[max(start - written, 0) * self.size:max(stop - written, 0) * self.size])
+        stop = min(stop, written)
+        per_chunk = max(self.chunk // self.size, 1)
+        while start < stop:
+            segment = (start // self.records) % self.segments
+            slot = start % self.records
+            n = min(stop - start, self.records - slot)  # until the end of the segment
+            with open(self.filename(segment), 'rb') as f:
+                f.seek(slot * self.size)
+                for i in range(0, n, per_chunk):
+                    yield f.read(min(per_chunk, n - i) * self.size)
+            start += n
+        if buffered:
+            yield buffered
+
+    def read(self, start=None, stop=None):
+        """
+        Generate records `start` to `stop` (default: all records kept)
+        as tuples of the sequence number and the values.
+        """
+        start = self.first if start is None else max(start, self.first)
+        stop = self.count if stop is None else min(stop, self.count)
+        for chunk in self.chunks(start, stop):
+            for i in range(0, len(chunk), self.size):
+                record = struct.unpack(self.format, chunk[i:i+self.size])
+                yield (record[0] - 1,) + record[1:]
+
+    def respond(self, request):
+        """
+        Return a response with the records (raw, including their sequence number)
+        in the Range of `request`, aligned on records, or all records kept
+        (malformed ranges are ignored, as by RFC 7233).
+        """
+        total = self.count * self.size
+        start, stop = self.first * self.size, total
+        status = 200
+        range = request.headers.get('range', '')
+        try:
+            low, high = range[6:].split(',')[0].split('-') if range.startswith('bytes=') else ('', '')
+            low, high = int(low) if low else None, int(high) if high else None
+        except ValueError:
+            low = high = None
+        if low is not None:
+            start = max(start, low)
+            stop = min(stop, high + 1) if high is not None else stop
+            status = 206
+        elif high is not None:  # suffix range: the last bytes
+            start = max(start, stop - high)
+            status = 206
+        start -= start % self.size
+        stop += -stop % self.size
+        headers = {'Content-Type': 'application/octet-stream', 'Accept-Ranges': 'bytes',
+                   'X-Record-Format': self.format}
+        if start >= stop and status == 206:
+            headers['Content-Range'] = 'bytes */%d' % total
+            return Response(status=416, headers=headers)
+        if status == 206:
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, stop - 1, total)
+        headers['Content-Length'] = stop - start
+        return Response(self.chunks(start // self.size, stop // self.size), status, headers)
+
+def makedirs(path):
+    """
+    Create directory `path` and its parents, if missing.
+    """
+    parts = path.split('/')
+    for i in range(1, len(parts) + 1):
+        current = '/'.join(parts[:i])
+        if current:
+            try:
+                os.mkdir(current)
+            except OSError:
+                pass  # exists
@@ -0,0 +1,200 @@
+"""
+Pipe topologies: split a source to several pipes (1:n) and join several
+sources into a pipe (n:1), eg. one sensor feeding a fast and a slow pipe:
+
+    tee = Tee(Poll(touch), n=2, size=4)
+    scheduler.add(tee, period=0.01)  # reads the sensor
+    scheduler.add(Pipe(tee.branches[0], Normalize(max=1023), Update(pwm)), period=0.01)
+    scheduler.add(Pipe(tee.branches[1], Mean(size=100), Publish(...)), period=1)
+
+Values waiting for a slower consumer are kept in bounded ring buffers,
+with an `overflow` policy for when a buffer is full:
+- 'drop-oldest' drops the oldest buffered value to store the new one,
+- 'drop-newest' drops the new value,
+- 'block' stops reading upstream until the buffer has room again.
+Sources return `skip` when they have no value available yet.
+"""
+
+from itiot.pipe import Source, Iterate, skip
+
+overflows = ('drop-oldest', 'drop-newest', 'block')
+
+def reader(obj):
+    """
+    Return `obj` as a source: objects with a `read` method (sources, pipes,
+    or eg. a machine.ADC) are used as-is, iterables are iterated.
+    """
+    return obj if hasattr(obj, 'read') else Iterate(obj)
+
+class Buffer(object):
+    """
+    Ring buffer of at most `size` values, preallocated,
+    counting the values `dropped` by the `overflow` policy.
+    """
+    __slots__ = ('items', 'overflow', 'head', 'length', 'dropped')
+
+    def __init__(self, size=4, overflow='drop-oldest'):
+        if overflow not in overflows:
+            raise ValueError('Unknown overflow policy: %s' % overflow)
+        self.items = [None] * size
+        self.overflow = overflow
+        self.head = 0
+        self.length = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def full(self):
+        return self.length == len(self.items)
+
+    @property
+    def blocked(self):
+        return self.overflow == 'block' and self.length == len(self.items)
+
+    def put(self, value):
+        """
+        Store `value`, returning False if it was dropped.
+        """
+        size = len(self.items)
+        if self.length == size:
+            self.dropped += 1
+            if self.overflow != 'drop-oldest':
+                return False
+            self.items[self.head] = None
+            self.head = (self.head + 1) % size
+            self.length -= 1
+        self.items[(self.head + self.length) % size] = value
+        self.length += 1
+        return True
+
+    def get(self):
+        """
+        Remove and return the oldest value, or `skip` if empty.
+        """
+        if not self.length:
+            return skip
+        value = self.items[self.head]
+        self.items[self.head] = None
+        self.head = (self.head + 1) % len(self.items)
+        self.length -= 1
+        return value
+
+class Branch(Source):
+    """
+    Source reading the values buffered for one consumer of a `Tee`.
+    """
+    __slots__ = ('buffer',)
+
+    def __init__(self, size=4, overflow='drop-oldest'):
+        self.buffer = Buffer(size, overflow)
+
+    def read(self):
+        return self.buffer.get()
+
+class Tee(Source):
+    """
+    Split `source` into `n` branches (1:n): each value read from the tee
+    is buffered into every branch, read by its own pipe at its own rate.
+    The tee also returns the value, so it can be the source of a pipe itself.
+    """
+    __slots__ = ('source', 'branches')
+
+    def __init__(self, source, n=2, size=4, overflow='drop-oldest'):
+        self.source = reader(source)
+        self.branches = [Branch(size, overflow) for _ in range(n)]
+
+    def read(self):
+        for branch in self.branches:
+            if branch.buffer.blocked:  # wait for the slowest branch
+                return skip
+        value = self.source.read()
+        if value is not skip:
+            for branch in self.branches:
+                branch.buffer.put(value)
+        return value
+
+class Merge(Source):
+    """
+    Join `sources` (n:1) into one stream of values, in the order they were read:
+    each read polls every source once, buffering values until they are returned.
+    Exhausted sources are removed.
+    """
+    __slots__ = ('sources', 'buffer')
+
+    def __init__(self, *sources, size=4, overflow='drop-oldest'):
+        self.sources = [reader(s) for s in sources]
+        self.buffer = Buffer(size, overflow)
+
+    def read(self):
+        for s in self.sources[:]:
+            if self.buffer.blocked:
+                break
+            try:
+                value = s.read()
+            except StopIteration:
+                self.sources.remove(s)
+                continue
+            if value is not skip:
+                self.buffer.put(value)
+        if not self.sources and not len(self.buffer):
+            raise StopIteration()
+        return self.buffer.get()
+
+class Zip(Source):
+    """
+    Join `sources` (n:1) into tuples of one value from each source,
+    or into `f(*values)` (eg. `f=lambda *values: sum(values) / len(values)`).
+    Values from faster sources are buffered until every source has one.
+    """
+    __slots__ = ('sources', 'buffers', 'f')
+
+    def __init__(self, *sources, size=4, overflow='drop-oldest', f=None):
+        self.sources = [reader(s) for s in sources]
+        self.buffers = [Buffer(size, overflow) for _ in sources]
+        self.f = f
+
+    def read(self):
+        ready = True
+        for s, buffer in zip(self.sources, self.buffers):
+            if not buffer.blocked:
+                value = s.read()
+                if value is not skip:
+                    buffer.put(value)
+            ready = ready and len(buffer)
+        if not ready:
+            return skip
+        values = tuple(buffer.get() for buffer in self.buffers)
+        return self.f(*values) if self.f else values
+
+class Latest(Source):
+    """
+    Join `sources` (n:1) into tuples of the latest value from each source,
+    or into `f(*values)`: slower sources repeat their latest value.
+    Reads return `skip` until every source produced a value.
+    Exhausted sources keep their latest value, until all are exhausted.
+    """
+    __slots__ = ('sources', 'values', 'f')
+
+    def __init__(self, *sources, f=None):
+        self.sources = [reader(s) for s in sources]
+        self.values = [skip] * len(sources)
+        self.f = f
+
+    def read(self):
+        for i, s in enumerate(self.sources):
+            if s is None:
+                continue
+            try:
+                value = s.read()
+            except StopIteration:
+                self.sources[i] = None
+                continue
+            if value is not skip:
+                self.values[i] = value
+        if not any(s is not None for s in self.sources):
+            raise StopIteration()
+        if skip in self.values:
+            return skip
+        return self.f(*self.values) if self.f else tuple(self.values)
@@ -0,0 +1,200 @@
+"""
+Pipe elements computing statistics over a moving window of the last values, eg.
+
+    pipe = Pipe(Poll(adc), Mean(size=32, typecode='H'), Normalize(max=4095))
+
+Windows are ring buffers preallocated in an `array` and statistics are
+updated with each value instead of being recomputed over the window:
+there is no allocation per value, as long as values are small ints
+(eg. raw ADC readings with `typecode='H'`); on MicroPython floats are
+allocated objects.
+Until a window is full, elements skip values unless `partial` is True.
+"""
+
+from array import array
+
+from itiot.pipe import Element, skip
+
+class Window(Element):
+    """
+    Ring buffer of the last `size` values, stored in an array of `typecode`.
+    Subclasses implement `update`, called with each new value and the value
+    it replaces (None until the window is full), and `result`.
+    """
+    __slots__ = ('size', 'partial', 'values', 'index', 'count')
+
+    def __init__(self, size=10, partial=False, typecode='f'):
+        self.size = size
+        self.partial = partial
+        self.values = array(typecode, [0] * size)
+        self.index = 0
+        self.count = 0
+
+    def process(self, value):
+        full = self.count == self.size
+        old = self.values[self.index]
+        self.values[self.index] = value
+        self.index += 1
+        if self.index == self.size:
+            self.index = 0
+        if not full:
+            self.count += 1
+        self.update(value, old if full else None)
+        if self.count < self.size and not self.partial:
+            return skip
+        return self.result()
+
+    def update(self, value, old):
+        pass
+
+    def result(self):
+        raise NotImplementedError('Implement the window statistic')
+
+class Mean(Window):
+    """
+    Mean of the last `size` values.
+    """
+    __slots__ = ('sum',)
+
+    def __init__(self, size=10, partial=False, typecode='f'):
+        Window.__init__(self, size, partial, typecode)
+        self.sum = 0
+
+    def update(self, value, old):
+        if old is not None:
+            value -= old
+        self.sum += value
+        if self.index == 0:
+            self.sum = sum(self.values)  # once per turn, cancels float rounding drift
+
+    def result(self):
+        return self.sum / self.count
+
+Average = Mean
+
+class Variance(Mean):
+    """
+    Variance of the last `size` values (`mean` is also available).
+    """
+    __slots__ = ('squares',)
+
+    def __init__(self, size=10, partial=False, typecode='f'):
+        Mean.__init__(self, size, partial, typecode)
+        self.squares = 0
+
+    def update(self, value, old):
+        Mean.update(self, value, old)
+        self.squares += value * value - (old * old if old is not None else 0)
+        if self.index == 0:
+            self.squares = 0
+            for value in self.values:
+                self.squares += value * value
+
+    @property
+    def mean(self):
+        return Mean.result(self)
+
+    def result(self):
+        mean = self.sum / self.count
+        return max(self.squares / self.count - mean * mean, 0)
+
+class Min(Window):
+    """
+    Minimum of the last `size` values, with a monotonic queue of the slots
+    of the values that can still become the minimum (the minimum first).
+    """
+    __slots__ = ('queue', 'head', 'length')
+
+    def __init__(self, size=10, partial=False, typecode='f'):
+        Window.__init__(self, size, partial, typecode)
+        self.queue = array('H', [0] * size)  # ring of slots in values
+        self.head = 0
+        self.length = 0
+
+    def better(self, a, b):
+        return a <= b
+
+    def update(self, value, old):
+        queue, size = self.queue, self.size
+        slot = self.index - 1 if self.index else size - 1
+        if self.length and queue[self.head] == slot:  # the minimum left the window
+            self.head = self.head + 1 if self.head + 1 < size else 0
+            self.length -= 1
+        while self.length:  # drop values that can no longer become the minimum
+            tail = self.head + self.length - 1
+            if tail >= size:
+                tail -= size
+            if not self.better(value, self.values[queue[tail]]):
+                break
+            self.length -= 1
+        tail = self.head + self.length
+        queue[tail - size if tail >= size else tail] = slot
+        self.length += 1
+
+    def result(self):
+        return self.values[self.queue[self.head]]
+
+class Max(Min):
+    """
+    Maximum of the last `size` values.
+    """
+    __slots__ = ()
+
+    def better(self, a, b):
+        return a >= b
+
+class Median(Window):
+    """
+    Median of the last `size` values, kept sorted in a second array.
+    """
+    __slots__ = ('ordered',)
+
+    def __init__(self, size=10, partial=False, typecode='f'):
+        Window.__init__(self, size, partial, typecode)
+        self.ordered = array(typecode, [0] * size)
+
+    def find(self, value, count):
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.ordered[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def update(self, value, old):
+        ordered = self.ordered
+        n = self.count - 1  # sorted values, besides the new one
+        if old is not None:  # remove the value leaving the window
+            for i in range(self.find(old, n + 1), n):
+                ordered[i] = ordered[i + 1]
+        i = n
+        while i > 0 and ordered[i - 1] > value:  # insert the new value
+            ordered[i] = ordered[i - 1]
+            i -= 1
+        ordered[i] = value
+
+    def result(self):
+        middle = self.count // 2
+        if self.count % 2:
+            return self.ordered[middle]
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+class EMA(Element):
+    """
+    Exponential moving average, weighting new values with `alpha` (0..1):
+    smooths like a window of about `2/alpha - 1` values, without storing any.
+    """
+    __slots__ = ('alpha', 'value')
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.value = None
+
+    def process(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
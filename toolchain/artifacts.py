@@ -0,0 +1,219 @@
+"""
+Local cache of downloaded firmwares and installed dependencies, so that
+repeated `mcu flash` and `mcu deps` cost no network nor install time,
+and work offline.
+
+Artifacts are files stored by content hash (sha256) and found by key:
+the URL for downloads, the hash of the requirements file for dependencies
+(installed with upip, cached as a tar). Their integrity is checked on use,
+and the least recently used are evicted when the cache exceeds its size.
+
+Usage, eg:
+`python3 toolchain/artifacts.py fetch http://micropython.org/.../esp32.bin --output /tmp/firmware.bin`
+`python3 toolchain/artifacts.py deps requirements.micropython.txt --output build/lib`
+`python3 toolchain/artifacts.py list`
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import time
+import urllib.request
+
+def digest(filename):
+    """
+    Return the sha256 of file `filename`, in hex.
+    """
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def size(text):
+    """
+    Return the bytes of a size like 512K, 256M or 1G.
+    """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper()
+    return int(float(text[:-1]) * units[text[-1]]) if text[-1:] in units else int(text)
+
+class Cache(object):
+    """
+    Content-addressed store in directory `path`: files are kept as
+    objects/<sha256>, and found by key in index.json with their hash, size
+    and time of last use. Least recently used files are evicted when the
+    store exceeds `size` bytes.
+    """
+
+    def __init__(self, path='build/artifacts', size=256 << 20):
+        self.path = path
+        self.size = size
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        try:
+            with open(os.path.join(path, 'index.json')) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def save(self):
+        filename = os.path.join(self.path, 'index.json')
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(filename + '.tmp', filename)
+
+    def object(self, sha256):
+        return os.path.join(self.path, 'objects', sha256)
+
+    def temporary(self):
+        return os.path.join(self.path, 'objects', 'tmp-%d-%d' % (os.getpid(), time.time() * 1e6))
+
+    def get(self, key):
+        """
+        Return the path of the file cached for `key`, or None if missing or corrupted.
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        path = self.object(entry['sha256'])
+        if not os.path.exists(path) or digest(path) != entry['sha256']:
+            print('+ Discarding corrupted artifact %s' % key)
+            self.discard(key)
+            return None
+        entry['used'] = time.time()
+        self.save()
+        return path
+
+    def put(self, key, filename):
+        """
+        Move file `filename` into the cache as `key`, returning its path in the cache.
+        """
+        sha256 = digest(filename)
+        if key in self.index and self.index[key]['sha256'] != sha256:
+            self.discard(key)  # replaced
+        path = self.object(sha256)
+        os.replace(filename, path)
+        self.index[key] = {'sha256': sha256, 'size': os.path.getsize(path), 'used': time.time()}
+        self.evict(keep=key)
+        self.save()
+        return path
+
+    def discard(self, key):
+        entry = self.index.pop(key)
+        if not any(other['sha256'] == entry['sha256'] for other in self.index.values()):
+            try:
+                os.remove(self.object(entry['sha256']))
+            except OSError:
+                pass
+        self.save()
+
+    def total(self):
+        return sum(dict((entry['sha256'], entry['size']) for entry in self.index.values()).values())
+
+    def evict(self, keep=None):
+        """
+        Discard the least recently used artifacts (but `keep`) until the cache fits its size.
+        """
+        for key in sorted(self.index, key=lambda key: self.index[key]['used']):
+            if self.total() <= self.size:
+                break
+            if key != keep:
+                print('+ Evicting artifact %s (%.1fM)' % (key, self.index[key]['size'] / (1 << 20)))
+                self.discard(key)
+
+def fetch(cache, url, output, sha256=None, refresh=False):
+    """
+    Copy the file at `url` to `output`, downloading it if not cached (or if `refresh`).
+    Raises OSError if `sha256` is given and does not match the download.
+    """
+    key = 'url:%s' % url
+    path = None if refresh else cache.get(key)
+    if path and sha256 and cache.index[key]['sha256'] != sha256:
+        path = None
+    if path:
+        print('+ Using cached %s' % url)
+    else:
+        print('+ Downloading %s' % url)
+        temporary = cache.temporary()
+        try:
+            with urllib.request.urlopen(url) as response, open(temporary, 'wb') as f:
+                shutil.copyfileobj(response, f)
+            if sha256 and digest(temporary) != sha256:
+                raise OSError('Checksum mismatch for %s, expected %s' % (url, sha256))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        path = cache.put(key, temporary)
+    shutil.copyfile(path, output)
+    print('+ %s: %.1fK, sha256 %s' % (output, os.path.getsize(output) / 1024, cache.index[key]['sha256']))
+
+def upip(requirements, output):
+    subprocess.check_call(['micropython', '-m', 'upip', 'install', '-p', output, '-r', requirements])
+
+def deps(cache, requirements, output, refresh=False, install=upip):
+    """
+    Install the dependencies in file `requirements` into directory `output`,
+    from the cache if they were installed before (and not `refresh`).
+    """
+    with open(requirements, 'rb') as f:
+        key = 'deps:%s' % hashlib.sha256(f.read()).hexdigest()
+    path = None if refresh else cache.get(key)
+    if os.path.exists(output):
+        shutil.rmtree(output)
+    if path:
+        print('+ Using cached dependencies for %s' % requirements)
+        with tarfile.open(path) as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(output, filter='data')
+            else:
+                tar.extractall(output)
+        return
+    os.makedirs(output)
+    install(requirements, output)
+    temporary = cache.temporary()
+    with tarfile.open(temporary, 'w:gz') as tar:
+        tar.add(output, arcname='.')
+    cache.put(key, temporary)
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache of firmwares and dependencies')
+    parser.add_argument('--cache', default='build/artifacts')
+    parser.add_argument('--size', default='256M', help='size of the cache, eg. 512M')
+    commands = parser.add_subparsers(dest='command')
+    command = commands.add_parser('fetch', help='download a file, if not cached')
+    command.add_argument('url')
+    command.add_argument('--output', required=True)
+    command.add_argument('--sha256', help='expected hash of the file')
+    command.add_argument('--refresh', action='store_true', help='download even if cached')
+    command = commands.add_parser('deps', help='install dependencies, if not cached')
+    command.add_argument('requirements')
+    command.add_argument('--output', required=True)
+    command.add_argument('--refresh', action='store_true', help='install even if cached')
+    commands.add_parser('list', help='list the artifacts cached')
+    commands.add_parser('evict', help='evict artifacts until the cache fits its size')
+    args = parser.parse_args()
+
+    cache = Cache(args.cache, size(args.size))
+    if args.command == 'fetch':
+        fetch(cache, args.url, args.output, args.sha256, args.refresh)
+    elif args.command == 'deps':
+        deps(cache, args.requirements, args.output, args.refresh)
+    elif args.command == 'list':
+        for key, entry in sorted(cache.index.items(), key=lambda item: item[1]['used']):
+            print('%s  %8.1fK  %s  %s' % (entry['sha256'][:12], entry['size'] / 1024,
+                                          time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['used'])), key))
+        print('%.1fM of %.1fM used' % (cache.total() / (1 << 20), cache.size / (1 << 20)))
+    elif args.command == 'evict':
+        cache.evict()
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
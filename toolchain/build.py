@@ -0,0 +1,218 @@
+"""
+Build python sources for the MCU: compile them ahead of time to .mpy
+bytecode with mpy-cross, so that the MCU does not compile them at boot.
+
+Compiled files are cached by content hash (of the source, the mpy-cross
+version and flags): unchanged files are not compiled again. The .mpy
+version emitted by mpy-cross is checked against the firmware, that only
+loads its own .mpy version.
+Optionally writes a manifest for freezing the modules into a firmware.
+Reports the size of sources and build products, and the RAM used by
+importing them, measured with the micropython unix port if installed
+(else estimated from sizes).
+
+Usage, eg:
+`python3 toolchain/build.py itiot --output build/local --cache build/cache`
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+def sources(paths):
+    """
+    Generate the (path, relative path) of python files in `paths`.
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            yield path, os.path.basename(path)
+            continue
+        parent = os.path.dirname(os.path.normpath(path))
+        for directory, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    filename = os.path.join(directory, name)
+                    yield filename, os.path.relpath(filename, parent)
+
+def native(source):
+    """
+    Return whether file `source` has functions for the native emitters
+    (@micropython.native or viper), that mpy-cross compiles only with -march.
+    """
+    with open(source, 'rb') as f:
+        return re.search(rb'^\s*@micropython\.(native|viper)\b', f.read(), re.M) is not None
+
+def strip(source, cache):
+    """
+    Return the path of a copy of `source` in `cache` without the
+    @micropython.native and viper decorators: its functions run as bytecode,
+    on firmwares or builds without the native emitters.
+    """
+    with open(source, 'rb') as f:
+        data = re.sub(rb'^[ \t]*@micropython\.(native|viper)\b.*\r?\n', b'', f.read(), flags=re.M)
+    product = os.path.join(cache, hashlib.sha256(data).hexdigest() + '.py')
+    if not os.path.exists(product):
+        with open(product + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(product + '.tmp', product)
+    return product
+
+def version(mpy_cross):
+    return subprocess.check_output([mpy_cross, '--version']).decode().strip()
+
+# first micropython release of each .mpy version, from the micropython docs (mpy_files)
+releases = (((1, 19, 0), 6), ((1, 12, 0), 5), ((1, 11, 0), 4), ((1, 9, 3), 3), ((1, 9, 0), 2))
+
+def firmware_mpy(firmware):
+    """
+    Return the .mpy version loaded by `firmware` (a micropython version or
+    a firmware URL, eg. 'esp32-idf3-20200902-v1.13.bin'), or None if unknown.
+    """
+    match = re.search(r'v(\d+)\.(\d+)(?:\.(\d+))?', firmware)
+    if not match:
+        return None
+    release = tuple(int(n or 0) for n in match.groups())
+    for first, mpy in releases:
+        if release >= first:
+            return mpy
+    return None
+
+def check(key, firmware):
+    """
+    Exit with an error if mpy-cross `key` (its version) emits a .mpy version
+    that `firmware` does not load.
+    """
+    emitted = re.search(r'mpy v(\d+)', key)
+    loaded = firmware_mpy(firmware)
+    if emitted and loaded is not None and int(emitted.group(1)) != loaded:
+        release = re.search(r'v(\d+\.\d+(?:\.\d+)?)', firmware).group(1)
+        sys.exit('mpy-cross emits mpy v%s (%s), but firmware v%s loads mpy v%d only: '
+                 'install mpy-cross %s (pip3 install mpy-cross==%s) or build raw'
+                 % (emitted.group(1), key.split(';')[0], release, loaded, release, release))
+
+def compile(mpy_cross, key, flags, source, relative, cache):
+    """
+    Return the path of `source` compiled to .mpy in `cache`, compiling it if missing,
+    and whether it was cached. `key` is the mpy-cross version.
+    """
+    digest = hashlib.sha256()
+    digest.update(key.encode())
+    digest.update(' '.join(flags).encode())
+    with open(source, 'rb') as f:
+        digest.update(f.read())
+    product = os.path.join(cache, digest.hexdigest() + '.mpy')
+    if os.path.exists(product):
+        return product, True
+    temporary = product + '.tmp'
+    # -s sets the source file name shown in tracebacks
+    subprocess.check_call([mpy_cross] + flags + ['-s', relative, '-o', temporary, source])
+    os.replace(temporary, product)
+    return product, False
+
+def measure(micropython, path, modules):
+    """
+    Return the bytes of RAM allocated by importing `modules` from `path`
+    with the micropython unix port, or None if not available or if any
+    module fails to import (eg. importing machine, on the unix port).
+    """
+    if not micropython or not modules:
+        return None
+    script = ('import gc, sys; sys.path.insert(0, %r); gc.collect(); before = gc.mem_alloc()\n'
+              'for module in %r:\n'
+              '    __import__(module)\n'
+              'gc.collect(); print(gc.mem_alloc() - before)') % (os.path.abspath(path), modules)
+    try:
+        return int(subprocess.check_output([micropython, '-c', script], stderr=subprocess.DEVNULL))
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+
+def size(n):
+    return '-' if n is None else '%.1fK' % (n / 1024)
+
+def build(paths, output, cache, mpy_cross='mpy-cross', flags=[], raw=False, freeze=None, micropython=None,
+          firmware=None):
+    if os.path.exists(output):
+        shutil.rmtree(output)
+    os.makedirs(cache, exist_ok=True)
+    if not raw and not shutil.which(mpy_cross):
+        sys.exit('mpy-cross not found: install it (pip3 install mpy-cross) or build raw')
+    key = None if raw else version(mpy_cross)
+    if key and firmware:
+        check(key, firmware)
+    print('+ Building %s to %s%s' % (', '.join(paths), output, ' (raw)' if raw else ' with %s' % key))
+    total_source = total_product = cached = 0
+    estimate_source = estimate_product = 0
+    modules = []
+    # native code needs mpy-cross -march or, as sources, a firmware with the native emitters (ESP32: v1.12, mpy v5)
+    emitter = (firmware_mpy(firmware or '') or 5) >= 5 if raw else any(flag.startswith('-march') for flag in flags)
+    for source, relative in sources(paths):
+        compiled = source
+        if not emitter and native(source):
+            print('+   %-36s @micropython.native dropped: build with mpy-cross -march '
+                  '(eg. MPY_CROSS_FLAGS=-march=xtensawin) and firmware v1.12+ for native code' % relative)
+            compiled = strip(source, cache)
+        if raw or os.path.basename(relative) in ('main.py', 'boot.py'):  # run as sources by the MCU
+            product, hit, destination = compiled, False, os.path.join(output, relative)
+        else:
+            module = relative[:-3].replace(os.sep, '.')
+            modules.append(module[:-9] if module.endswith('.__init__') else module)
+            product, hit = compile(mpy_cross, key, flags, compiled, relative, cache)
+            destination = os.path.join(output, relative[:-3] + '.mpy')
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(product, destination)
+        total_source += os.path.getsize(source)
+        total_product += os.path.getsize(destination)
+        cached += hit
+        estimate_source += 2 * os.path.getsize(source)
+        estimate_product += os.path.getsize(destination) * (2 if destination.endswith('.py') else 1)
+        print('+   %-36s %8s -> %8s%s' % (relative, size(os.path.getsize(source)),
+                                         size(os.path.getsize(destination)), ' (cached)' if hit else ''))
+    if freeze:
+        with open(freeze, 'w') as f:
+            f.write('# Modules to freeze into the firmware, eg:\n'
+                    '# make BOARD=ESP32_GENERIC FROZEN_MANIFEST=%s\n' % os.path.abspath(freeze))
+            f.write("include('$(PORT_DIR)/boards/manifest.py')\n")
+            for path in paths:
+                path = os.path.abspath(path)
+                if os.path.isfile(path):
+                    f.write('module(%r, base_path=%r)\n' % (os.path.basename(path), os.path.dirname(path)))
+                else:
+                    f.write('package(%r, base_path=%r)\n' % (os.path.basename(path), os.path.dirname(path)))
+        print('+ Wrote freeze manifest %s' % freeze)
+    print('+ Size: %s of sources, %s built (%d of %d cached)'
+          % (size(total_source), size(total_product), cached, len(modules)))
+    ram_source = measure(micropython, os.path.dirname(os.path.abspath(paths[0])), modules)
+    ram_product = measure(micropython, output, modules)
+    if ram_source is None or ram_product is None:
+        # importing a .mpy keeps about its size of bytecode in RAM, compiling
+        # a .py peaks at about twice its size (parse tree and bytecode)
+        ram_source, ram_product, how = estimate_source, estimate_product, 'estimated from sizes'
+        if micropython and modules:
+            how = 'not measured: a module failed to import with %s, %s' % (micropython, how)
+    else:
+        how = 'measured with %s' % micropython
+    print('+ RAM to import: %s from sources, %s built (%s)' % (size(ram_source), size(ram_product), how))
+
+def main():
+    parser = argparse.ArgumentParser(description='Build python sources for the MCU')
+    parser.add_argument('paths', nargs='+', help='python files or packages')
+    parser.add_argument('--output', default='build/local')
+    parser.add_argument('--cache', default='build/cache', help='directory of compiled files, by content hash')
+    parser.add_argument('--mpy-cross', default=os.environ.get('MPY_CROSS', 'mpy-cross'))
+    parser.add_argument('--flags', default=os.environ.get('MPY_CROSS_FLAGS', ''),
+                        help='mpy-cross flags, eg. "-march=xtensawin" for @micropython.native on ESP32')
+    parser.add_argument('--raw', action='store_true', help='copy sources, do not compile')
+    parser.add_argument('--freeze', help='write a manifest for freezing the modules into a firmware')
+    parser.add_argument('--firmware', default=os.environ.get('FIRMWARE_URL'),
+                        help='firmware URL or micropython version, eg. v1.13, to check the .mpy version against')
+    args = parser.parse_args()
+    build(args.paths, args.output, args.cache, args.mpy_cross, args.flags.split(), args.raw, args.freeze,
+          shutil.which('micropython'), args.firmware)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Deploy to a fleet of MCUs in parallel: flash, deps, build and copy run
+on all devices at once, so that a deployment takes about the time of the
+slowest device instead of the sum of all devices.
+
+Local work (downloading the firmware, installing dependencies, building)
+is done once, then each device runs its steps in a worker thread, retrying
+failed steps. Devices are serial ports, or directories standing in for
+devices (see sync.Directory), given as paths, globs or comma-separated lists.
+
+Usage, eg:
+`python3 toolchain/fleet.py '/dev/ttyUSB*' --steps deps,build`
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import artifacts
+import build
+import sync
+
+def devices(patterns):
+    """
+    Return the devices given by `patterns` (paths, globs or comma-separated lists), in order.
+    """
+    found = []
+    for pattern in patterns:
+        for item in pattern.split(','):
+            matches = sorted(glob.glob(item)) if glob.has_magic(item) else [item]
+            found.extend(match for match in matches if match and match not in found)
+    return found
+
+def label(device):
+    return os.path.basename(device.rstrip('/')) or device
+
+def transport(device, baud=115200):
+    return sync.Directory(device) if os.path.isdir(device) else sync.Pyboard(device, baud)
+
+def run(command, log):
+    """
+    Run `command`, logging the end of its output and raising OSError if it fails.
+    """
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if process.returncode:
+        for line in process.stdout.decode(errors='replace').splitlines()[-5:]:
+            log('+   %s' % line)
+        raise OSError('%s exited with code %d' % (command[0], process.returncode))
+
+def flash(firmware, baud=460800):
+    """
+    Return a step erasing the device and writing file `firmware` to it.
+    """
+    def step(device, log):
+        if os.path.isdir(device):  # simulated device
+            shutil.copyfile(firmware, os.path.join(device, 'firmware.bin'))
+            return
+        run(['esptool.py', '--chip', 'auto', '--port', device, 'erase_flash'], log)
+        run(['esptool.py', '--chip', 'auto', '--port', device, '--baud', str(baud),
+             'write_flash', '--compress', '0x1000', firmware], log)
+    return step
+
+def upload(source, target, name, rename=None, baud=115200, connect=transport):
+    """
+    Return a step syncing `source` to `target` on the device (see sync.sync).
+    """
+    def step(device, log):
+        device_transport = connect(device, baud)
+        try:
+            sync.sync(source, target, device_transport, name, rename, log=log)
+        finally:
+            device_transport.close()
+    return step
+
+class Result(object):
+    """
+    Outcome of the deployment to `device`: the (step, seconds, attempts)
+    done, the total `time`, and the `error` that stopped it, if any.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.steps = []
+        self.time = 0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def retries(self):
+        return sum(attempts - 1 for step, seconds, attempts in self.steps)
+
+class Fleet(object):
+    """
+    Run `steps`, a list of (name, function(device, log)), on each of `devices`
+    with `workers` threads (default: one per device). A failed step is retried
+    `retries` times, `delay` seconds apart; a device stops at the first step
+    that fails all its attempts.
+    """
+
+    def __init__(self, devices, steps, workers=None, retries=2, delay=1):
+        self.devices = devices
+        self.steps = steps
+        self.workers = workers or len(devices) or 1
+        self.retries = retries
+        self.delay = delay
+        self.lock = threading.Lock()  # for printing whole lines
+
+    def log(self, device, message):
+        with self.lock:
+            print('[%s] %s' % (label(device), message))
+
+    def deploy(self, device):
+        result = Result(device)
+        log = lambda message: self.log(device, message)
+        start = time.time()
+        for name, function in self.steps:
+            for attempt in range(1, self.retries + 2):
+                log('* %s%s' % (name, ' (attempt %d)' % attempt if attempt > 1 else ''))
+                begin = time.time()
+                try:
+                    function(device, log)
+                except Exception as e:  # eg. OSError, rshell.pyboard.PyboardError
+                    log('+ %s failed: %s' % (name, e))
+                    if attempt > self.retries:
+                        result.error = '%s: %s' % (name, e)
+                        break
+                    time.sleep(self.delay)
+                    continue
+                result.steps.append((name, time.time() - begin, attempt))
+                log('+ %s done in %.1fs' % (name, time.time() - begin))
+                break
+            if result.error:
+                break
+        result.time = time.time() - start
+        return result
+
+    def run(self):
+        """
+        Deploy to all devices, returning their results and the elapsed time.
+        """
+        start = time.time()
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(self.deploy, self.devices))
+        return results, time.time() - start
+
+def report(results, elapsed):
+    print()
+    print('* Deployed to %d of %d devices in %.1fs (%.1fs sequentially)'
+          % (sum(result.ok for result in results), len(results), elapsed, sum(r.time for r in results)))
+    for result in results:
+        steps = ', '.join('%s %.1fs' % (name, seconds) for name, seconds, attempts in result.steps)
+        print('+ %-24s %-6s %6.1fs  %s%s%s' % (result.device, 'ok' if result.ok else 'FAILED', result.time, steps,
+                                             ' (%d retries)' % result.retries if result.retries else '',
+                                             '  %s' % result.error if result.error else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy to MCUs in parallel')
+    parser.add_argument('devices', nargs='+', help='serial ports or directories, as paths, globs or lists')
+    parser.add_argument('--steps', default='flash,deps,build,copy', help='comma-separated steps')
+    parser.add_argument('--workers', type=int, help='devices deployed at once (default: all)')
+    parser.add_argument('--retries', type=int, default=2, help='attempts after a step failed')
+    parser.add_argument('--firmware', default='http://micropython.org/resources/firmware/esp32-idf3-20200902-v1.13.bin')
+    parser.add_argument('--firmware-file', default='/tmp/firmware.bin')
+    parser.add_argument('--flash-baud', type=int, default=460800)
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--requirements', default='requirements.micropython.txt')
+    parser.add_argument('--deps', default='build/lib', help='directory of dependencies')
+    parser.add_argument('--artifacts', default='build/artifacts', help='cache of firmwares and dependencies')
+    parser.add_argument('--build-path', default='build')
+    parser.add_argument('--source', default='itiot', help='library to build')
+    parser.add_argument('--mpy-cross', default=os.environ.get('MPY_CROSS', 'mpy-cross'))
+    parser.add_argument('--flags', default=os.environ.get('MPY_CROSS_FLAGS', ''))
+    parser.add_argument('--raw', action='store_true', help='copy sources, do not compile')
+    parser.add_argument('--copy', default='examples/tutorial.py', help='file or directory to copy')
+    parser.add_argument('--copy-target', default='main.py', help='name of the copied file on the device')
+    parser.add_argument('--flash-path', default='/pyboard')
+    args = parser.parse_args()
+
+    targets = devices(args.devices)
+    if not targets:
+        sys.exit('No devices found for: %s' % ' '.join(args.devices))
+    names = args.steps.split(',')
+    unknown = set(names) - set(('flash', 'deps', 'build', 'copy'))
+    if unknown:
+        sys.exit('Unknown steps: %s' % ', '.join(sorted(unknown)))
+    print('* Deploying %s to %d devices: %s' % (', '.join(names), len(targets), ', '.join(targets)))
+    steps = []
+    cache = artifacts.Cache(args.artifacts)
+    if 'flash' in names:
+        artifacts.fetch(cache, args.firmware, args.firmware_file)
+        steps.append(('flash', flash(args.firmware_file, args.flash_baud)))
+    if 'deps' in names:
+        print('+ Building dependencies from %s in %s' % (args.requirements, args.deps))
+        artifacts.deps(cache, args.requirements, args.deps)
+        steps.append(('deps', upload(args.deps, '%s/%s' % (args.flash_path, os.path.basename(args.deps)),
+                                     'deps', baud=args.baud)))
+    if 'build' in names:
+        product = os.path.join(args.build_path, 'local')
+        build.build([args.source], product, os.path.join(args.build_path, 'cache'),
+                    args.mpy_cross, args.flags.split(), args.raw, firmware=args.firmware)
+        steps.append(('build', upload(product, args.flash_path, 'build', baud=args.baud)))
+    if 'copy' in names and not os.path.exists(args.copy):
+        print('+ Skipping copy: no such file or directory: %s' % args.copy)
+    elif 'copy' in names:
+        if os.path.isdir(args.copy):
+            target = '%s/%s' % (args.flash_path, os.path.basename(os.path.normpath(args.copy)))
+            steps.append(('copy', upload(args.copy, target, os.path.basename(target), baud=args.baud)))
+        else:
+            steps.append(('copy', upload(args.copy, args.flash_path, args.copy_target.replace('/', '-'),
+                                         args.copy_target, args.baud)))
+    print()
+    try:
+        results, elapsed = Fleet(targets, steps, args.workers, args.retries).run()
+    finally:
+        if 'flash' in names and os.path.exists(args.firmware_file):
+            os.remove(args.firmware_file)
+    report(results, elapsed)
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""
+Sync a local directory (or file) to the MCU filesystem, uploading only
+the files that changed since the last sync.
+
+A manifest of the file hashes synced is kept on the device (one per sync
+`name`, eg. build, deps). It is fetched once per sync and compared with the
+local files: changed files are uploaded in compressed chunks, files deleted
+locally are deleted from the device, then the manifest is updated.
+Uploading a .mpy deletes its .py on the device, that would be imported instead.
+
+Usage, eg:
+`python3 toolchain/sync.py build/local /pyboard --name build --port /dev/ttyUSB0`
+`python3 toolchain/sync.py build/local /pyboard --name build --ota 192.168.0.20`  # over Wi-Fi, see itiot/ota.py
+`python3 toolchain/sync.py build/local /tmp/device --name build --directory`  # for testing
+"""
+
+import argparse
+import binascii
+import hashlib
+import http.client
+import json
+import os
+import sys
+import time
+import urllib.parse
+import zlib
+
+wbits = 10  # compression window of 1K, for decompressing with little RAM on the MCU
+
+def manifest(source, name=None):
+    """
+    Return the sha256 of the files in `source` by relative path,
+    or of file `source` by `name`.
+    """
+    if not os.path.exists(source):
+        raise OSError('No such file or directory: %s' % source)
+    hashes = {}
+    if os.path.isfile(source):
+        files = [(source, name or os.path.basename(source))]
+    else:
+        files = []
+        for directory, dirs, names in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for filename in sorted(names):
+                path = os.path.join(directory, filename)
+                files.append((path, os.path.relpath(path, source).replace(os.sep, '/')))
+    for path, relative in files:
+        with open(path, 'rb') as f:
+            hashes[relative] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+def chunks(data, size=1024):
+    """
+    Generate (compressed, payload) chunks of `data`, compressed when it saves bytes.
+    """
+    for i in range(0, len(data), size):
+        chunk = data[i:i+size]
+        compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+        compressed = compressor.compress(chunk) + compressor.flush()
+        yield (True, compressed) if len(compressed) < len(chunk) else (False, chunk)
+
+def device(path):
+    """
+    Return the path on the device of `path`, starting with /pyboard (rshell's name for the device).
+    """
+    if path.startswith('/pyboard'):
+        path = path[8:]
+    return path or '/'
+
+class Directory(object):
+    """
+    Local directory standing in for the device filesystem, eg. for testing.
+    """
+
+    chunk = 1024  # bytes of file per transfer
+
+    def __init__(self, root=None):
+        self.root = root  # prefix of device paths, if given
+        self.sent = 0  # bytes transferred
+
+    def path(self, path):
+        return os.path.join(self.root, path.lstrip('/')) if self.root else path
+
+    def read(self, path):
+        try:
+            with open(self.path(path), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def mkdir(self, path):
+        os.makedirs(self.path(path), exist_ok=True)
+
+    def write(self, path, chunks):
+        with open(self.path(path), 'wb') as f:
+            for compressed, payload in chunks:
+                self.sent += len(payload)
+                f.write(zlib.decompress(payload, wbits) if compressed else payload)
+
+    def delete(self, path):
+        try:
+            os.remove(self.path(path))
+        except OSError:
+            pass
+
+    def close(self):
+        pass
+
+class Pyboard(object):
+    """
+    Device filesystem over the raw REPL, with rshell's pyboard module.
+    """
+
+    chunk = 1024
+
+    setup = '\n'.join((
+        'import os, ubinascii',
+        'try:',
+        '    from zlib import decompress',
+        '    unz = lambda b: decompress(b, %d)' % wbits,
+        'except ImportError:',  # micropython >= 1.21
+        '    import deflate, io',
+        '    unz = lambda b: deflate.DeflateIO(io.BytesIO(b), deflate.ZLIB, %d).read()' % wbits,
+        'def mkdir(p):',
+        '    try:',
+        '        os.mkdir(p)',
+        '    except OSError:',
+        '        pass'))
+
+    def __init__(self, port, baud=115200):
+        from rshell.pyboard import Pyboard
+        self.board = Pyboard(port, baudrate=baud)
+        self.board.enter_raw_repl()
+        self.board.exec_(self.setup)
+        self.sent = 0
+
+    def path(self, path):
+        return device(path)
+
+    def execute(self, code):
+        self.sent += len(code)
+        return self.board.exec_(code)
+
+    def read(self, path):
+        try:
+            return self.execute("print(open(%r).read(), end='')" % self.path(path))
+        except Exception:  # rshell.pyboard.PyboardError, file missing
+            return None
+
+    def mkdir(self, path):
+        self.execute('mkdir(%r)' % self.path(path))
+
+    def write(self, path, chunks):
+        self.execute("f = open(%r, 'wb')" % self.path(path))
+        for compressed, payload in chunks:
+            data = binascii.b2a_base64(payload).decode().strip()
+            self.execute('f.write(%s(ubinascii.a2b_base64(%r)))' % ('unz' if compressed else '', data))
+        self.execute('f.close()')
+
+    def delete(self, path):
+        self.execute('try:\n    os.remove(%r)\nexcept OSError:\n    pass' % self.path(path))
+
+    def close(self):
+        self.board.exit_raw_repl()
+        self.board.close()
+
+class Ota(object):
+    """
+    Device filesystem over HTTP, with an itiot.ota.Receiver on the device at `host`:`port`.
+    """
+
+    chunk = 4096  # within http.Request.body_limit, and decompressed in RAM on the MCU
+
+    def __init__(self, host, port=80, token=None, prefix='/ota'):
+        self.connection = http.client.HTTPConnection(host, port, timeout=10)
+        self.token = token
+        self.prefix = prefix
+        self.sent = 0
+
+    def request(self, method, endpoint, path, body=b'', **arguments):
+        """
+        Return the response body of a request to `endpoint` for `path`,
+        or None if not found. Raises OSError if the request failed.
+        """
+        arguments['path'] = device(path)
+        url = '%s/%s?%s' % (self.prefix, endpoint, urllib.parse.urlencode(arguments))
+        headers = {'X-OTA-Token': self.token} if self.token else {}
+        for attempt in (1, 2):
+            try:
+                self.connection.request(method, url, body, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.connection.close()  # kept-alive connection closed by the device: reconnect once
+                if attempt == 2:
+                    raise
+        self.sent += len(body)
+        if response.status == 404 and method == 'GET':
+            return None
+        if response.status >= 300:
+            raise OSError('%s %s failed: %d %s' % (method, url, response.status, data.decode(errors='replace')))
+        return data
+
+    def read(self, path):
+        return self.request('GET', 'file', path)
+
+    def mkdir(self, path):
+        self.request('POST', 'mkdir', path)
+
+    def write(self, path, chunks):
+        digest = hashlib.sha256()
+        size = 0
+        for compressed, payload in chunks:
+            arguments = {'offset': size, 'crc': '%08x' % zlib.crc32(payload)}
+            if compressed:
+                arguments['z'] = 1
+            self.request('PUT', 'file', path, payload, **arguments)
+            data = zlib.decompress(payload, wbits) if compressed else payload
+            digest.update(data)
+            size += len(data)
+        if not size:
+            self.request('PUT', 'file', path, b'')  # empty file
+        self.request('POST', 'commit', path, size=size, sha256=digest.hexdigest())
+
+    def delete(self, path):
+        self.request('DELETE', 'file', path)
+
+    def close(self):
+        self.connection.close()
+
+def sync(source, target, transport, name=None, rename=None, delete=True, chunk=None, log=print):
+    """
+    Sync `source` (a directory, or a file uploaded as `rename`) to `target`
+    with `transport`, returning the lists of paths uploaded and deleted.
+    Progress is reported with `log`.
+    """
+    start = time.time()
+    local = manifest(source, rename)
+    path = '%s/.sync-%s.json' % (target.rstrip('/'), name or 'default')
+    remote = json.loads(transport.read(path) or '{}')
+    upload = [p for p in sorted(local) if remote.get(p) != local[p]]
+    stale = [p for p in sorted(remote) if p not in local] if delete else []
+    log('+ Syncing %s to %s: %d files to upload, %d to delete, %d unchanged'
+        % (source, target, len(upload), len(stale), len(local) - len(upload)))
+    transport.mkdir(target)
+    if upload or stale:
+        # forget files about to change: if interrupted, they are uploaded again next time
+        pending = dict((p, h) for p, h in remote.items() if p not in upload and p not in stale)
+        transport.write(path, [(False, json.dumps(pending).encode())])
+    directories = set()
+    for p in upload:
+        for i, c in enumerate(p):
+            if c == '/' and p[:i] not in directories:
+                directories.add(p[:i])
+                transport.mkdir('%s/%s' % (target, p[:i]))
+        filename = source if os.path.isfile(source) else os.path.join(source, p)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        log('+   %s (%d bytes)' % (p, len(data)))
+        transport.write('%s/%s' % (target, p), chunks(data, chunk or transport.chunk))
+        if p.endswith('.mpy') and p[:-4] + '.py' not in local:
+            transport.delete('%s/%s.py' % (target, p[:-4]))  # eg. from a raw build: imported instead of the .mpy
+    for p in stale:
+        log('+   %s (deleted)' % p)
+        transport.delete('%s/%s' % (target, p))
+    if upload or stale:
+        transport.write(path, [(False, json.dumps(local).encode())])
+    log('+ Synced in %.1fs, %d bytes sent' % (time.time() - start, transport.sent))
+    return upload, stale
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync files to the MCU, uploading only changed files')
+    parser.add_argument('source', help='local directory or file')
+    parser.add_argument('target', help='directory on the device, eg. /pyboard/lib')
+    parser.add_argument('--name', help='name of the sync, for its manifest on the device (default: source name)')
+    parser.add_argument('--rename', help='name of the file on the device, if source is a file')
+    parser.add_argument('--keep', action='store_true', help='do not delete files deleted locally')
+    parser.add_argument('--port', default=os.environ.get('DEVICE', '/dev/ttyUSB0'))
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--ota', help='sync over Wi-Fi to host[:port], with itiot.ota.Receiver on the device')
+    parser.add_argument('--token', default=os.environ.get('OTA_TOKEN'), help='token of the OTA receiver')
+    parser.add_argument('--directory', action='store_true', help='sync to a local directory instead of a device')
+    args = parser.parse_args()
+    if not os.path.exists(args.source):
+        sys.exit('No such file or directory: %s' % args.source)
+    if args.directory:
+        transport = Directory()
+    elif args.ota:
+        host, _, port = args.ota.partition(':')
+        transport = Ota(host, int(port or 80), args.token)
+    else:
+        transport = Pyboard(args.port, args.baud)
+    try:
+        sync(args.source, args.target, transport, args.name or os.path.basename(os.path.normpath(args.source)),
+             args.rename, not args.keep)
+    finally:
+        transport.close()
+
+if __name__ == '__main__':
+    main()